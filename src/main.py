@@ -1,11 +1,20 @@
 import argparse
+import functools
 import logging
 import threading
-import time
 
 from shark.shark import Shark, SharkConfig
-from shark.marketplace_response import Item
+from shark.marketplace_response import Item, MarketplaceResponse
+from shark.packet_monitor import PacketMonitor, PacketMonitorConfig
+from shark.replay import replay_pcap
+from shark.capture import CAPTURE_BACKENDS
+from shark.parse_pool import PARSE_EXECUTORS
+from shark.exporter import EXPORT_COMPRESSIONS
+from shark.price_history import PriceHistory, PriceHistoryConfig
 
+from sharker.ml import MODEL_ENGINES
+from sharker.online import OnlineLearnerConfig
+from sharker.server import PredictionServerConfig, serve
 from sharker.sharker import Sharker, SharkerConfig
 
 from config import MONITORED_IPS, LOCAL_DEFAULT_INTERFACE, DATA_DIR
@@ -13,17 +22,26 @@ from config import MONITORED_IPS, LOCAL_DEFAULT_INTERFACE, DATA_DIR
 logger = logging.getLogger(__name__)
 
 
-def inspect(shark: Shark):
-    l = len(shark.packet_monitor.responses)
-    while not shark.is_stopped():
-        # print a simplified version of the most recent response if there is a new one
-        if l != len(shark.packet_monitor.responses):
-            for item in shark.packet_monitor.responses[-1].items:
-                logger.info(f"{item.name}: {item.price}")
+def inspect(response: MarketplaceResponse, history: PriceHistory = None):
+    # print a simplified version of every response as soon as it is parsed
+    for item in response.items:
+        message = f"{item.name}: {item.price}"
 
-            l = len(shark.packet_monitor.responses)
+        # items have been scored already when a model is trained
+        if getattr(item, "predicted_price", None) is not None:
+            message += f", predicted {item.predicted_price:.0f}"
+        if getattr(item, "discount", None) is not None:
+            message += f", discount {item.discount:.0%}"
 
-        time.sleep(1)
+        # what the same item has been listed for recently, not counting this page
+        stats = history.stats(item.name, item.rarity) if history is not None else None
+        if stats is not None:
+            message += (
+                f", last hour {stats.count} listed at {stats.min:.0f}-{stats.max:.0f} each"
+                f" (median {stats.median:.0f})"
+            )
+
+        logger.info(message)
 
 
 def main():
@@ -37,9 +55,26 @@ def main():
         - gather: Creates a packet watcher and automatically scans the marketplace to collect large training datasets.
         - train: Trains the model using the gathered data.
         - predict: Uses the trained model to predict prices.
+        - replay: Feeds a saved pcap capture through the packet monitor and reports the parsing throughput.
+        - serve: Keeps the model loaded and serves predictions over a local HTTP endpoint.
 
     Arguments:
-        --mode: Mode of operation (choices: "inspect", "gather", "train", "predict"). Default is "predict".
+        --mode: Mode of operation (choices: "inspect", "gather", "train", "predict", "replay", "serve"). Default is "predict".
+        --pcap: The pcap file to read in replay mode.
+        --backend: The packet capture backend (choices: "pyshark", "afpacket"). Default is "pyshark".
+        --parse-workers: The number of workers parsing responses off the capture thread. Default is 0 (parse inline).
+        --parse-executor: Run the parse workers as threads or processes (choices: "thread", "process"). Default is "thread".
+        --stream-export: Append items to NDJSON files as soon as they are parsed instead of exporting when monitoring stops.
+        --export-compression: Compression of the streaming export (choices: "none", "gzip", "zstd"). Default is "none".
+        --export-format: The file format written when monitoring stops (choices: "json", "parquet"). Default is "json".
+        --port: The port to serve predictions on in serve mode. Default is 8765.
+        --batch-window-ms: How long a prediction request waits for others to batch with in serve mode. Default is 2.
+        --engine: The model trained in train mode (choices: "linear", "hist_gradient_boosting"). Default is "linear".
+        --sharded: Also train one model per item name in train mode; predictions use it once trained.
+        --shard-by-rarity: Train one model per item name and rarity instead.
+        --select: Cross-validate candidate regressors of every engine in train mode and keep the most accurate; can't be combined with --engine.
+        --keep-duplicates: Export, train on and count in price history every sighting of a listing instead of once per listing.
+        --online: Keep updating an online model with every response seen in inspect mode, checkpointing it periodically.
     """
     logging.basicConfig(format="%(levelname)-8s :: %(message)s", level=logging.INFO)
 
@@ -50,10 +85,113 @@ def main():
         default="predict",
         required=False,
         help="Mode of operation",
-        choices=["inspect", "scan", "train", "predict"],
+        choices=["inspect", "scan", "train", "predict", "replay", "serve"],
+    )
+    parser.add_argument(
+        "--pcap",
+        type=str,
+        required=False,
+        help="The pcap file to read in replay mode",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="pyshark",
+        required=False,
+        help="Packet capture backend; afpacket reads raw frames on Linux without tshark",
+        choices=CAPTURE_BACKENDS,
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=0,
+        required=False,
+        help="Workers parsing responses off the capture thread; 0 parses inline",
+    )
+    parser.add_argument(
+        "--parse-executor",
+        type=str,
+        default="thread",
+        required=False,
+        help="Run the parse workers as threads or processes",
+        choices=PARSE_EXECUTORS,
+    )
+    parser.add_argument(
+        "--stream-export",
+        action="store_true",
+        help="Append items to NDJSON files as soon as they are parsed",
+    )
+    parser.add_argument(
+        "--export-compression",
+        type=str,
+        default="none",
+        required=False,
+        help="Compression of the streaming export; zstd requires the zstandard package",
+        choices=EXPORT_COMPRESSIONS,
+    )
+    parser.add_argument(
+        "--export-format",
+        type=str,
+        default="json",
+        required=False,
+        help="The file format written when monitoring stops; parquet loads much faster for training",
+        choices=["json", "parquet"],
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        required=False,
+        help="The port to serve predictions on in serve mode",
+    )
+    parser.add_argument(
+        "--batch-window-ms",
+        type=float,
+        default=2.0,
+        required=False,
+        help="How long a prediction request waits for others to batch with in serve mode",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        # None tells an explicit --engine linear apart from the default
+        default=None,
+        required=False,
+        help="The model trained in train mode; hist_gradient_boosting captures interactions between properties",
+        choices=MODEL_ENGINES,
+    )
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help="Also train one model per item name; names with few items use the global model",
+    )
+    parser.add_argument(
+        "--shard-by-rarity",
+        action="store_true",
+        help="Train one model per item name and rarity instead of per name",
+    )
+    parser.add_argument(
+        "--select",
+        action="store_true",
+        help="Cross-validate candidate regressors of every engine in train mode and keep the most accurate",
+    )
+    parser.add_argument(
+        "--keep-duplicates",
+        action="store_true",
+        help="Export, train on and count in price history every sighting of a listing instead of once per listing",
+    )
+    parser.add_argument(
+        "--online",
+        action="store_true",
+        help="Update an online model with every response seen in inspect mode",
     )
     args = parser.parse_args()
 
+    if args.select and args.engine is not None:
+        parser.error(
+            "--select compares every engine; it can't be combined with --engine"
+        )
+
     if args.mode == "inspect":
         # Inspect Mode creates a packet watcher but doesn't automatically scan the marketplace; allowing manual scans.
         shark = Shark(
@@ -61,24 +199,56 @@ def main():
                 interface=LOCAL_DEFAULT_INTERFACE,
                 ips=MONITORED_IPS,
                 data_dir=f"{DATA_DIR}\export",
+                backend=args.backend,
+                parse_workers=args.parse_workers,
+                parse_executor=args.parse_executor,
+                stream_export=args.stream_export,
+                export_compression=args.export_compression,
+                export_format=args.export_format,
+                dedup_listings=not args.keep_duplicates,
+            )
+        )
+        # score each response before it is logged, if a model has been trained
+        sharker = Sharker(
+            SharkerConfig(
+                model_path=f"{DATA_DIR}",
+                model_name=f"model.pkl",
+                raw_data_path=f"{DATA_DIR}\export",
+                prepared_data_path=f"{DATA_DIR}\prepared",
+            )
+        )
+        if args.online:
+            # items are scored before they are learned from, so discounts aren't biased by their own price
+            learner = sharker.enable_online_learning(
+                OnlineLearnerConfig(checkpoint_path=f"{DATA_DIR}\online_model.pkl")
+            )
+            shark.packet_monitor.subscribe(sharker.score_response)
+            shark.packet_monitor.subscribe(
+                learner.learn_response, on_close=learner.checkpoint
             )
+        elif sharker.model is not None:
+            shark.packet_monitor.subscribe(sharker.score_response)
+        # pages are logged against the history before they are added to it
+        history = PriceHistory(
+            PriceHistoryConfig(dedup_listings=not args.keep_duplicates),
+            seen_listings=shark.seen_listings,
         )
+        shark.packet_monitor.subscribe(functools.partial(inspect, history=history))
+        shark.packet_monitor.subscribe(history.ingest_response)
+
         packet_monitor_thread = threading.Thread(
             target=shark.packet_monitor.begin_monitoring
         )
         keypress_listener_thread = threading.Thread(target=shark.listen_for_keypress)
-        packet_logger_thread = threading.Thread(target=inspect, args=(shark,))
 
         packet_monitor_thread.start()
         keypress_listener_thread.start()
-        packet_logger_thread.start()
 
         packet_monitor_thread.join()
         keypress_listener_thread.join()
-        packet_logger_thread.join()
 
         logger.info("Shark and Sharker has stopped.")
-        logger.info(f"Collected {len(shark.packet_monitor.responses)} responses.")
+        logger.info(f"Collected {shark.packet_monitor.response_count} responses.")
 
         shark.export_data()
 
@@ -93,6 +263,11 @@ def main():
                 model_name=f"model.pkl",
                 raw_data_path=f"{DATA_DIR}\export",
                 prepared_data_path=f"{DATA_DIR}\prepared",
+                engine=args.engine or "linear",
+                sharded=args.sharded or args.shard_by_rarity,
+                shard_by_rarity=args.shard_by_rarity,
+                select_model=args.select,
+                dedup_listings=not args.keep_duplicates,
             )
         )
 
@@ -133,6 +308,56 @@ def main():
         }
         prediction = sharker.predict(Item.from_dict(sample_item_raw))
         logger.info(f"Predicted price: {prediction}")
+    elif args.mode == "replay":
+        # Replay Mode parses a saved capture at disk speed; useful after changes to the response parser.
+        if args.pcap is None:
+            parser.error("--pcap is required in replay mode")
+
+        packet_monitor = PacketMonitor(
+            PacketMonitorConfig(
+                interface=None,
+                bpf_filter=" or ".join(
+                    [f"src host {ip} or dst host {ip}" for ip in MONITORED_IPS]
+                ),
+                parse_workers=args.parse_workers,
+                parse_executor=args.parse_executor,
+                # responses are only counted; a long capture would otherwise pile up in memory
+                keep_responses=False,
+            )
+        )
+
+        stats = replay_pcap(packet_monitor, args.pcap)
+
+        logger.info(
+            f"Replayed {stats.packets} packets in {stats.elapsed:.2f}s: "
+            f"{stats.responses} responses, {stats.items} items "
+            f"({stats.packets_per_second:.0f} packets/s, {stats.items_per_second:.0f} items/s)"
+        )
+        logger.info(f"Reassembly statistics: {packet_monitor.reassembler.stats}")
+        if packet_monitor.parse_pool is not None:
+            packet_monitor.parse_pool.close()
+            logger.info(f"Parse statistics: {packet_monitor.parse_pool.stats}")
+    elif args.mode == "serve":
+        # Serve Mode keeps the model loaded so other tools don't each pay to load it.
+        sharker = Sharker(
+            SharkerConfig(
+                model_path=f"{DATA_DIR}",
+                model_name=f"model.pkl",
+                raw_data_path=f"{DATA_DIR}\export",
+                prepared_data_path=f"{DATA_DIR}\prepared",
+            )
+        )
+        if sharker.model is None:
+            logger.error("Model has not been trained yet.")
+            return
+
+        serve(
+            sharker,
+            PredictionServerConfig(
+                port=args.port,
+                batch_window=args.batch_window_ms / 1000,
+            ),
+        )
     else:
         logger.error("Invalid mode")
 
@@ -0,0 +1,245 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import pyshark
+import socket
+import struct
+
+from pyshark.packet.packet import Packet
+
+from shark.segment import LINKTYPE_ETHERNET, TcpSegment, parse_frame
+
+logger = logging.getLogger(__name__)
+
+ETH_P_ALL = 0x0003
+SO_ATTACH_FILTER = 26
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+PCAP_NETMASK_UNKNOWN = 0xFFFFFFFF
+
+# with generic receive offload the kernel hands over coalesced frames that can be far
+# larger than the MTU, and with BIG TCP larger than an IP total length can express
+MAX_FRAME_SIZE = 256 * 1024
+
+CAPTURE_BACKENDS = ["pyshark", "afpacket"]
+
+
+class PysharkCapture:
+    """
+    Captures packets through tshark using pyshark.
+    Works on every platform tshark supports but decodes each packet in a subprocess.
+    """
+
+    def __init__(self, interface: str, bpf_filter: str):
+        self.interface = interface
+        self.bpf_filter = bpf_filter
+
+    def segments(self, is_stopped):
+        """
+        Yield TCP segments until is_stopped returns True.
+        """
+        # pyshark drives tshark from an asyncio event loop
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+        capture = pyshark.LiveCapture(
+            interface=self.interface,
+            bpf_filter=self.bpf_filter,
+        )
+
+        try:
+            for packet in capture.sniff_continuously():
+                if is_stopped():
+                    break
+
+                segment = segment_from_packet(packet)
+                if segment is not None:
+                    yield segment
+        finally:
+            capture.close()
+
+
+class AfPacketCapture:
+    """
+    Captures raw frames from a Linux AF_PACKET socket.
+
+    The BPF filter is compiled with libpcap and attached to the socket, so the kernel
+    discards unrelated traffic before it is copied to user space.
+    """
+
+    def __init__(
+        self,
+        interface: str,
+        bpf_filter: str,
+        receive_buffer_size: int = 32 * 1024 * 1024,
+        poll_interval: float = 1.0,
+    ):
+        self.interface = interface
+        self.bpf_filter = bpf_filter
+        self.receive_buffer_size = receive_buffer_size
+        self.poll_interval = poll_interval
+
+    def segments(self, is_stopped):
+        """
+        Yield TCP segments until is_stopped returns True.
+        """
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+
+        try:
+            # a large receive buffer absorbs bursts while a response is being reassembled
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer_size
+            )
+            self.__attach_filter(sock)
+            sock.bind((self.interface, 0))
+
+            # wake up periodically so a stop request is noticed on a quiet interface
+            sock.settimeout(self.poll_interval)
+
+            buffer = bytearray(MAX_FRAME_SIZE)
+            truncated = 0
+            while not is_stopped():
+                try:
+                    # MSG_TRUNC returns the real length of a frame that didn't fit
+                    length = sock.recv_into(buffer, MAX_FRAME_SIZE, socket.MSG_TRUNC)
+                except socket.timeout:
+                    continue
+
+                if length > MAX_FRAME_SIZE:
+                    # a cut off frame would leave a hole in the middle of a response
+                    truncated += 1
+                    logger.warning(
+                        f"Dropping a {length} byte frame larger than the receive buffer "
+                        f"({truncated} dropped)"
+                    )
+                    continue
+
+                # segments keep views of the frame, so it can't stay in the reused buffer
+                frame = bytes(buffer[:length])
+                segment = parse_frame(frame, LINKTYPE_ETHERNET)
+                if segment is not None:
+                    yield segment
+        finally:
+            self.__log_statistics(sock)
+            sock.close()
+
+    def __attach_filter(self, sock: socket.socket):
+        if not self.bpf_filter:
+            return
+
+        try:
+            program = compile_bpf_filter(self.bpf_filter, LINKTYPE_ETHERNET)
+        except OSError as e:
+            logger.warning(
+                f"Unable to compile BPF filter, filtering in user space instead: {e}"
+            )
+            return
+
+        instructions = ctypes.create_string_buffer(program)
+        fprog = struct.pack("HL", len(program) // 8, ctypes.addressof(instructions))
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+    def __log_statistics(self, sock: socket.socket):
+        try:
+            packets, drops = struct.unpack(
+                "II", sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8)
+            )
+        except OSError:
+            return
+
+        logger.info(f"AF_PACKET capture received {packets} frames, dropped {drops}")
+
+
+class _BpfProgram(ctypes.Structure):
+    _fields_ = [("bf_len", ctypes.c_uint), ("bf_insns", ctypes.c_void_p)]
+
+
+def compile_bpf_filter(bpf_filter: str, linktype: int, snaplen: int = 65535) -> bytes:
+    """
+    Compile a BPF filter expression into classic BPF bytecode using libpcap.
+
+    Returns the packed `struct sock_filter` instructions, 8 bytes each.
+    """
+    library = ctypes.util.find_library("pcap")
+    if library is None:
+        raise OSError("libpcap not found")
+
+    libpcap = ctypes.CDLL(library)
+    libpcap.pcap_open_dead.restype = ctypes.c_void_p
+    libpcap.pcap_open_dead.argtypes = [ctypes.c_int, ctypes.c_int]
+    libpcap.pcap_compile.argtypes = [
+        ctypes.c_void_p,
+        ctypes.POINTER(_BpfProgram),
+        ctypes.c_char_p,
+        ctypes.c_int,
+        ctypes.c_uint32,
+    ]
+    libpcap.pcap_geterr.restype = ctypes.c_char_p
+    libpcap.pcap_geterr.argtypes = [ctypes.c_void_p]
+    libpcap.pcap_freecode.argtypes = [ctypes.POINTER(_BpfProgram)]
+    libpcap.pcap_close.argtypes = [ctypes.c_void_p]
+
+    handle = libpcap.pcap_open_dead(linktype, snaplen)
+    if not handle:
+        raise OSError("pcap_open_dead failed")
+
+    try:
+        program = _BpfProgram()
+        if (
+            libpcap.pcap_compile(
+                handle,
+                ctypes.byref(program),
+                bpf_filter.encode("utf-8"),
+                1,
+                PCAP_NETMASK_UNKNOWN,
+            )
+            != 0
+        ):
+            raise OSError(libpcap.pcap_geterr(handle).decode("utf-8"))
+
+        try:
+            return ctypes.string_at(program.bf_insns, program.bf_len * 8)
+        finally:
+            libpcap.pcap_freecode(ctypes.byref(program))
+    finally:
+        libpcap.pcap_close(handle)
+
+
+def create_capture(backend: str, interface: str, bpf_filter: str):
+    """
+    Create the capture backend with the given name.
+    """
+    if backend == "pyshark":
+        return PysharkCapture(interface, bpf_filter)
+    if backend == "afpacket":
+        return AfPacketCapture(interface, bpf_filter)
+
+    raise ValueError(f"Unknown capture backend: {backend}")
+
+
+def segment_from_packet(packet: Packet) -> TcpSegment | None:
+    """
+    Convert a pyshark packet into a TCP segment.
+    """
+    try:
+        return TcpSegment(
+            src=packet.ip.src,
+            dst=packet.ip.dst,
+            src_port=int(packet.tcp.srcport),
+            dst_port=int(packet.tcp.dstport),
+            seq=int(packet.tcp.seq),
+            ack=int(packet.tcp.ack),
+            payload=get_payload(packet) or b"",
+        )
+    except AttributeError:
+        return None
+
+
+def get_payload(packet: Packet) -> bytearray | None:
+    """
+    Extract the payload from a packet and replace colons with empty strings to give a hex byte array.
+    """
+    try:
+        return bytearray.fromhex(packet.tcp.payload.replace(":", ""))
+    except AttributeError:
+        return None
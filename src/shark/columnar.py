@@ -0,0 +1,276 @@
+import logging
+
+import numpy as np
+
+from constants import H_ITEM_ID, H_ITEM_PROPERTY
+from dataclasses import dataclass
+from datetime import datetime
+from shark.marketplace_response import (
+    Vocabulary,
+    _scan_found_by,
+    _scan_item_id,
+    _scan_item_property,
+    _scan_price,
+    begins_marketplace_response,
+    calculate_footer,
+    ends_marketplace_response,
+    item_boundaries,
+    rarity_str,
+    searchable,
+)
+from utils import vlq_decode_little_endian_array
+
+logger = logging.getLogger(__name__)
+
+# the values of the rarity column, in code order
+RARITIES = (
+    "Poor",
+    "Common",
+    "Uncommon",
+    "Rare",
+    "Epic",
+    "Legendary",
+    "Unique",
+    "Unknown",
+)
+RARITY_CODES = {rarity: code for code, rarity in enumerate(RARITIES)}
+
+
+@dataclass
+class ItemColumns:
+    names: list  # The item names, indexed by name_id
+    property_names: list  # The property names, one per column of properties
+    response: np.ndarray  # The index of the payload each item was decoded from
+    name_id: np.ndarray  # The index of each item's name in names
+    rarity: np.ndarray  # The index of each item's rarity in RARITIES
+    stack_count: np.ndarray  # The number of items in each stack
+    price: np.ndarray  # The price of each listing, -1 if it couldn't be decoded
+    expiry_ms: np.ndarray  # Milliseconds from decoded_at to expiry, -1 if unknown
+    properties: np.ndarray  # One row per item, 0 where it doesn't have the property
+    decoded_at: datetime  # The time the listing expiry is relative to
+
+    def __len__(self):
+        return len(self.name_id)
+
+    @property
+    def expiry_ts(self) -> np.ndarray:
+        """
+        The expiry time of each listing.
+        """
+        return np.datetime64(self.decoded_at, "ms") + self.expiry_ms.astype(
+            "timedelta64[ms]"
+        )
+
+
+class _ColumnBuilder:
+    """
+    Collects the columns of a batch while its payloads are scanned.
+
+    Strings are mapped to ids through caches keyed on the raw bytes, so each distinct name is
+    decoded once per batch. Price and expiry are only located here and decoded together at the end.
+    """
+
+    def __init__(self, names: Vocabulary, property_names: Vocabulary):
+        self.names = names
+        self.property_names = property_names
+        self.name_ids = {}
+        self.rarity_codes = {}
+        self.property_ids = {}
+
+        self.response = []
+        self.name_id = []
+        self.rarity = []
+        self.stack_count = []
+        self.price_starts = []
+        self.price_ends = []
+        self.ts_starts = []
+        self.ts_ends = []
+        self.property_rows = []
+        self.property_columns = []
+        self.property_values = []
+
+    def add_response(self, response: int, data, base: int):
+        """
+        Scan every item of a response, with offsets into the batch buffer starting at base.
+        Nothing is added if any item of the response can't be decoded.
+        """
+        footer = calculate_footer(data)
+        if footer is None:
+            raise ValueError("Payload does not end with marketplace response footer")
+
+        row = len(self.name_id)
+        items = [
+            self.__scan_item(data, start, end)
+            for start, end in item_boundaries(data, footer[0] + len(data))
+        ]
+
+        for i, (
+            name_id,
+            rarity,
+            stack_count,
+            properties,
+            price_start,
+            price_end,
+            ts_start,
+            ts_end,
+        ) in enumerate(items):
+            self.name_id.append(name_id)
+            self.rarity.append(rarity)
+            self.stack_count.append(stack_count)
+            self.price_starts.append(base + price_start)
+            self.price_ends.append(base + price_end)
+            self.ts_starts.append(base + ts_start)
+            self.ts_ends.append(base + ts_end)
+
+            for property_id, value in properties:
+                self.property_rows.append(row + i)
+                self.property_columns.append(property_id)
+                self.property_values.append(value)
+
+        self.response.extend([response] * len(items))
+
+    def build(self, buffer, decoded_at: datetime) -> ItemColumns:
+        properties = np.zeros((len(self.name_id), len(self.property_names)), np.int16)
+        # later values win, as they do when an item's properties are read into a dict
+        properties[self.property_rows, self.property_columns] = self.property_values
+
+        return ItemColumns(
+            names=self.names.names,
+            property_names=self.property_names.names,
+            response=np.array(self.response, np.int32),
+            name_id=np.array(self.name_id, np.int32),
+            rarity=np.array(self.rarity, np.int8),
+            stack_count=np.array(self.stack_count, np.int16),
+            price=vlq_decode_little_endian_array(
+                buffer, self.price_starts, self.price_ends
+            ),
+            expiry_ms=vlq_decode_little_endian_array(
+                buffer, self.ts_starts, self.ts_ends
+            ),
+            properties=properties,
+            decoded_at=decoded_at,
+        )
+
+    def __scan_item(self, data, start: int, end: int) -> tuple:
+        # the same walk as decode_item, but strings become ids and numbers are only located
+        id_start = data.find(H_ITEM_ID, start, end)
+        if id_start == -1:
+            raise ValueError("ID not found in item payload")
+
+        name_end, rarity_start, pos = _scan_item_id(data, id_start, end)
+
+        name_key = data[id_start + len(H_ITEM_ID) : name_end]
+        name_id = self.name_ids.get(name_key)
+        if name_id is None:
+            name_id = self.name_ids[name_key] = self.names.id(name_key.decode("utf-8"))
+
+        rarity_key = None if rarity_start is None else data[rarity_start:pos]
+        rarity = self.rarity_codes.get(rarity_key)
+        if rarity is None:
+            rarity = self.rarity_codes[rarity_key] = RARITY_CODES[
+                rarity_str(None if rarity_key is None else rarity_key.decode("utf-8"))
+            ]
+
+        # stack count is a single byte after the 0x18 byte
+        if pos + 2 >= end or data[pos] != 0x18 or data[pos + 2] != 0x20:
+            raise ValueError("stack count not found in item payload")
+        stack_count = data[pos + 1]
+        pos += 3
+
+        properties = []
+        property_start = data.find(H_ITEM_PROPERTY, pos, end)
+        while property_start != -1:
+            name_start, property_name_end, pos = _scan_item_property(
+                data, property_start, end
+            )
+
+            property_key = data[name_start:property_name_end]
+            property_id = self.property_ids.get(property_key)
+            if property_id is None:
+                property_id = self.property_ids[property_key] = self.property_names.id(
+                    property_key.decode("utf-8")
+                )
+
+            # If the value is negative, it is represented as a 2's complement
+            value = data[property_name_end + 1]
+            if data[property_name_end + 2 : property_name_end + 3] == b"\xff":
+                value -= 256
+
+            properties.append((property_id, value))
+            property_start = data.find(H_ITEM_PROPERTY, pos, end)
+
+        # loot state
+        if pos < end and data[pos] == 0x58:
+            if pos + 1 >= end:
+                raise ValueError("loot state not found in item payload")
+            pos += 2
+
+        found_by = _scan_found_by(data, pos, end)
+        if found_by is not None:
+            pos = found_by[2]
+
+        price_start, pos = _scan_price(data, pos, end)
+
+        return (
+            name_id,
+            rarity,
+            stack_count,
+            properties,
+            price_start,
+            pos,
+            pos + 1,
+            min(pos + 6, end),
+        )
+
+
+def decode_columns(
+    payloads,
+    names: Vocabulary = None,
+    property_names: Vocabulary = None,
+) -> ItemColumns:
+    """
+    Decode a batch of marketplace response payloads straight into column arrays.
+
+    No Item objects are created. Pass the same vocabularies to every batch to keep name ids
+    and property columns stable between batches; by default they are numbered in order of
+    first appearance, matching the columns built by prepare_data.
+    Payloads that can't be decoded are logged and skipped.
+    """
+    if names is None:
+        names = Vocabulary()
+    if property_names is None:
+        property_names = Vocabulary()
+
+    builder = _ColumnBuilder(names, property_names)
+    decoded_at = datetime.now()
+    chunks = []
+    base = 0
+
+    for response, payload in enumerate(payloads):
+        data, _ = searchable(payload)
+        if not isinstance(data, bytes):
+            # strings are looked up by their raw bytes, which must be hashable
+            data = bytes(data)
+
+        if not begins_marketplace_response(data):
+            logger.error(
+                f"Skipping payload {response}: does not begin with marketplace response header"
+            )
+            continue
+        if not ends_marketplace_response(data):
+            logger.error(
+                f"Skipping payload {response}: does not end with marketplace response footer"
+            )
+            continue
+
+        try:
+            builder.add_response(response, data, base)
+        except ValueError as e:
+            logger.error(f"Skipping payload {response}: {e}")
+            continue
+
+        chunks.append(data)
+        base += len(data)
+
+    # the numbers of every item are decoded in one pass over a single buffer
+    return builder.build(b"".join(chunks), decoded_at)
@@ -0,0 +1,147 @@
+import logging
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PARQUET_EXTENSION = ".parquet"
+
+# properties are stored sparsely, as a list of (name, value) pairs per item
+ITEM_SCHEMA = pa.schema(
+    [
+        ("name", pa.string()),
+        ("rarity", pa.string()),
+        ("stack_count", pa.int16()),
+        (
+            "properties",
+            pa.list_(pa.struct([("name", pa.string()), ("value", pa.int16())])),
+        ),
+        ("loot_state", pa.string()),
+        ("found_by_name", pa.string()),
+        ("found_by_tag", pa.string()),
+        ("sold_by_name", pa.string()),
+        ("sold_by_tag", pa.string()),
+        ("sold_by_leaderboard_rank", pa.string()),
+        ("price", pa.int64()),
+        ("expiry_ts", pa.timestamp("ms")),
+    ]
+)
+
+# the columns needed to train a price model
+TRAINING_COLUMNS = ["name", "rarity", "stack_count", "properties", "price"]
+
+
+def items_table(items) -> pa.Table:
+    """
+    Build an Arrow table of items, sorted by name and rarity.
+
+    Sorting keeps each name in as few row groups as possible, so filtering by name or
+    rarity can skip most of a file using the row group statistics.
+    """
+    columns = {field: [] for field in ITEM_SCHEMA.names}
+    for item in items:
+        for field, values in columns.items():
+            if field == "properties":
+                values.append(
+                    [
+                        {"name": name, "value": value}
+                        for name, value in item.properties.items()
+                    ]
+                )
+            else:
+                values.append(getattr(item, field, None))
+
+    table = pa.Table.from_pydict(columns, schema=ITEM_SCHEMA)
+    return table.sort_by([("name", "ascending"), ("rarity", "ascending")])
+
+
+def write_dataset(items, path: str, row_group_size: int = 64 * 1024) -> int:
+    """
+    Write items to a Parquet file. Returns the number of items written.
+    """
+    table = items_table(items)
+    pq.write_table(
+        table,
+        path,
+        row_group_size=row_group_size,
+        compression="zstd",
+        # names, rarities and players repeat across listings
+        use_dictionary=True,
+    )
+    logger.info(f"Saved {table.num_rows} items to {path}")
+    return table.num_rows
+
+
+def dataset_files(directory: str) -> list:
+    """
+    List the Parquet files in a directory.
+    """
+    return sorted(
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory)
+        if filename.endswith(PARQUET_EXTENSION)
+    )
+
+
+def read_dataset(
+    paths,
+    columns: list = None,
+    names: list = None,
+    rarities: list = None,
+) -> pa.Table:
+    """
+    Read items from one or more Parquet files.
+
+    Only the given columns are read. Filtering by names or rarities is pushed down to
+    the files, so row groups without a matching item are never decoded.
+    """
+    dataset = ds.dataset(paths, schema=ITEM_SCHEMA, format="parquet")
+
+    condition = None
+    if names is not None:
+        condition = ds.field("name").isin(names)
+    if rarities is not None:
+        rarity_condition = ds.field("rarity").isin(rarities)
+        condition = (
+            rarity_condition if condition is None else condition & rarity_condition
+        )
+
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def table_properties(table: pa.Table) -> tuple:
+    """
+    Expand the sparse properties column.
+
+    Returns (rows, names, values) arrays with one entry per property of every item,
+    where rows is the index of the item in the table.
+    """
+    properties = table.column("properties")
+    entries = pc.list_flatten(properties)
+
+    return (
+        pc.list_parent_indices(properties).to_numpy(),
+        pc.struct_field(entries, "name").to_numpy(),
+        pc.struct_field(entries, "value").to_numpy(),
+    )
+
+
+def dataset_items(table: pa.Table) -> list:
+    """
+    Convert a table back into item dicts, in the format of Item.dict().
+    """
+    records = table.to_pylist()
+    for record in records:
+        if "properties" in record:
+            record["properties"] = {
+                entry["name"]: entry["value"] for entry in record["properties"] or ()
+            }
+        if isinstance(record.get("expiry_ts"), datetime):
+            record["expiry_ts"] = record["expiry_ts"].isoformat()
+    return records
@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import weakref
+
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# expiry is decoded relative to when a response arrives, so the same listing seen twice
+# has slightly different expiries; within a bucket they fingerprint the same
+EXPIRY_BUCKET_SECONDS = 300
+
+
+def listing_fingerprint(
+    sold_by_tag: str,
+    name: str,
+    rarity: str,
+    properties: dict,
+    price: int,
+    expiry_ts,
+) -> int:
+    """
+    A stable 64 bit fingerprint of a listing, the same however often and wherever it is seen.
+    expiry_ts can be a datetime, an ISO string as exported, or None.
+    """
+    if isinstance(expiry_ts, str):
+        expiry_ts = datetime.fromisoformat(expiry_ts)
+    expiry_bucket = (
+        int(expiry_ts.timestamp() // EXPIRY_BUCKET_SECONDS) if expiry_ts else None
+    )
+
+    key = "\x1f".join(
+        [
+            str(sold_by_tag),
+            str(name),
+            str(rarity),
+            ",".join(f"{k}={v}" for k, v in sorted((properties or {}).items())),
+            str(price),
+            str(expiry_bucket),
+        ]
+    )
+    # signed so it fits an int64 column
+    return int.from_bytes(
+        hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(),
+        "little",
+        signed=True,
+    )
+
+
+def item_fingerprint(item) -> int:
+    return listing_fingerprint(
+        item.sold_by_tag,
+        item.name,
+        item.rarity,
+        item.properties,
+        item.price,
+        item.expiry_ts,
+    )
+
+
+def record_fingerprint(record: dict) -> int:
+    """
+    The fingerprint of an exported item dict; matches item_fingerprint of the item it came from.
+    """
+    return listing_fingerprint(
+        record.get("sold_by_tag"),
+        record.get("name"),
+        record.get("rarity"),
+        record.get("properties"),
+        record.get("price"),
+        record.get("expiry_ts"),
+    )
+
+
+def decodes(item) -> bool:
+    """
+    Whether every field of an item can be decoded.
+    """
+    # lazy items locate their sections when parsed, but text that isn't valid UTF-8 only
+    # fails once it is decoded; one bad item shouldn't lose the whole export
+    decode = getattr(item, "decode", None)
+    if decode is None:
+        return True
+
+    try:
+        decode()
+    except ValueError as e:
+        logger.error(f"Skipping an item that could not be decoded: {e}")
+        return False
+    return True
+
+
+class SeenListings:
+    """
+    Remembers the fingerprints of recently seen listings in bounded memory.
+
+    Fingerprints are kept in two generations of at most capacity each. When the current
+    generation fills up, the older one is dropped, so at most 2 * capacity fingerprints
+    (roughly 70 bytes each) are held. A listing seen again is moved to the current
+    generation, so it's remembered for at least capacity listings after it was last seen.
+
+    Consumers of the same responses, such as the export and the price history, can share
+    one instance through new_response_items; each response is only checked once.
+    """
+
+    def __init__(self, capacity: int = 500_000):
+        self.capacity = capacity
+        self.current = set()
+        self.previous = set()
+        self.duplicates = 0
+        # the new items of each response still in memory
+        self.responses = weakref.WeakKeyDictionary()
+
+    def add(self, fingerprint: int) -> bool:
+        """
+        Remember a fingerprint. Returns True if it hadn't been seen.
+        """
+        if fingerprint in self.current:
+            self.duplicates += 1
+            return False
+
+        seen = fingerprint in self.previous
+
+        self.current.add(fingerprint)
+        if len(self.current) >= self.capacity:
+            self.previous = self.current
+            self.current = set()
+
+        if seen:
+            self.duplicates += 1
+            return False
+
+        return True
+
+    def new_items(self, items) -> list:
+        """
+        The items that haven't been seen, remembering them. Items that can't be decoded
+        can't be told apart from their repeats, so they are dropped.
+        """
+        return [
+            item for item in items if decodes(item) and self.add(item_fingerprint(item))
+        ]
+
+    def new_response_items(self, response) -> list:
+        """
+        The items of a response that hadn't been seen before it. Asking again for the same
+        response gives the same items, whoever asked first.
+        """
+        items = self.responses.get(response)
+        if items is None:
+            items = self.responses[response] = self.new_items(response.items)
+        return items
@@ -0,0 +1,236 @@
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+from dataclasses import dataclass
+from datetime import datetime
+
+from shark.marketplace_response import MarketplaceResponse
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# raised when a compressed export ends partway through a batch
+_TRUNCATION_ERRORS = (EOFError, zlib.error) + (
+    (zstandard.ZstdError,) if zstandard is not None else ()
+)
+
+EXPORT_COMPRESSIONS = ["none", "gzip", "zstd"]
+
+# file extensions of streaming exports, by compression
+NDJSON_EXTENSIONS = {
+    "none": ".ndjson",
+    "gzip": ".ndjson.gz",
+    "zstd": ".ndjson.zst",
+}
+
+
+@dataclass
+class StreamingExporterConfig:
+    data_dir: str  # The directory to write export files to
+    compression: str = "none"  # Frame each batch with gzip or zstd
+    rotate_bytes: int = 64 * 1024 * 1024  # Uncompressed bytes per file, 0 for no limit
+    rotate_seconds: float = 60 * 60  # Seconds per file, 0 for no limit
+    batch_items: int = 1000  # Items buffered before they are written
+    flush_seconds: float = 5.0  # Longest a buffered item waits, 0 for full batches only
+
+
+class StreamingExporter:
+    """
+    Appends exported items to NDJSON files while monitoring is running.
+
+    Each item is one JSON line, in the same format as Shark.export_data. Items are written
+    in batches, and with compression each batch is a complete gzip member or zstd frame,
+    so everything up to the last flush can be read back after a crash.
+    Subscribe export() to a packet monitor to export every response as it is parsed.
+
+    A background thread writes a batch that has waited flush_seconds, so items are on disk
+    within that time even when no more responses arrive.
+    """
+
+    def __init__(self, config: StreamingExporterConfig):
+        if config.compression not in EXPORT_COMPRESSIONS:
+            raise ValueError(f"Unknown export compression: {config.compression}")
+        if config.compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+
+        self.config = config
+        self.lock = threading.Lock()
+        self.batch = []
+        self.batch_items = 0
+        self.last_flush = time.monotonic()
+        self.items_written = 0
+
+        self.file = None
+        self.filename = None
+        self.file_opened = 0.0
+        self.file_bytes = 0
+
+        if config.compression == "zstd":
+            self.compressor = zstandard.ZstdCompressor()
+
+        self.stop_event = threading.Event()
+        self.flusher = None
+        if config.flush_seconds > 0:
+            self.flusher = threading.Thread(
+                target=self.__flush_periodically, name="export-flusher", daemon=True
+            )
+            self.flusher.start()
+
+    def export(self, response: MarketplaceResponse):
+        """
+        Buffer the items of a response, writing the batch once it is full or old enough.
+        """
+        self.export_items(response.items)
+
+    def export_items(self, items: list):
+        """
+        Buffer items, writing the batch once it is full or old enough.
+        """
+        lines = "".join(json.dumps(item.dict()) + "\n" for item in items)
+
+        with self.lock:
+            self.batch.append(lines)
+            self.batch_items += len(items)
+
+            if self.batch_items >= self.config.batch_items or (
+                self.config.flush_seconds
+                and time.monotonic() - self.last_flush >= self.config.flush_seconds
+            ):
+                self.__flush()
+
+    def flush(self):
+        """
+        Write the buffered items.
+        """
+        with self.lock:
+            self.__flush()
+
+    def close(self):
+        """
+        Write the buffered items and close the current file.
+        """
+        self.stop_event.set()
+        if self.flusher is not None:
+            self.flusher.join()
+
+        with self.lock:
+            self.__flush()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                logger.info(
+                    f"Exported {self.items_written} items to {self.config.data_dir}"
+                )
+
+    def __flush_periodically(self):
+        # a batch is due flush_seconds after the last flush; export_items may have flushed since
+        while not self.stop_event.wait(
+            max(self.last_flush + self.config.flush_seconds - time.monotonic(), 0)
+        ):
+            with self.lock:
+                if time.monotonic() - self.last_flush >= self.config.flush_seconds:
+                    self.__flush()
+
+    def __flush(self):
+        self.last_flush = time.monotonic()
+        if not self.batch:
+            return
+
+        data = "".join(self.batch).encode("utf-8")
+        items = self.batch_items
+        self.batch = []
+        self.batch_items = 0
+
+        if self.__should_rotate():
+            self.__rotate()
+
+        self.file.write(self.__frame(data))
+        self.file.flush()
+
+        self.file_bytes += len(data)
+        self.items_written += items
+        logger.debug(f"Exported {items} items to {self.filename}")
+
+    def __frame(self, data: bytes) -> bytes:
+        if self.config.compression == "gzip":
+            return gzip.compress(data)
+        if self.config.compression == "zstd":
+            return self.compressor.compress(data)
+        return data
+
+    def __should_rotate(self) -> bool:
+        if self.file is None:
+            return True
+        if self.config.rotate_bytes and self.file_bytes >= self.config.rotate_bytes:
+            return True
+        if (
+            self.config.rotate_seconds
+            and time.monotonic() - self.file_opened >= self.config.rotate_seconds
+        ):
+            return True
+        return False
+
+    def __rotate(self):
+        if self.file is not None:
+            self.file.close()
+
+        if not os.path.exists(self.config.data_dir):
+            os.makedirs(self.config.data_dir)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        self.filename = os.path.join(
+            self.config.data_dir,
+            f"responses_{timestamp}{NDJSON_EXTENSIONS[self.config.compression]}",
+        )
+        self.file = open(self.filename, "ab")
+        self.file_opened = time.monotonic()
+        self.file_bytes = 0
+        logger.info(f"Exporting items to {self.filename}")
+
+
+def is_ndjson_export(filename: str) -> bool:
+    return filename.endswith(tuple(NDJSON_EXTENSIONS.values()))
+
+
+def read_ndjson_export(path: str):
+    """
+    Yield the item dicts of a streaming export.
+
+    An export cut short by a crash is read up to the last complete line.
+    """
+    if path.endswith(NDJSON_EXTENSIONS["gzip"]):
+        f = gzip.open(path, "rb")
+    elif path.endswith(NDJSON_EXTENSIONS["zstd"]):
+        if zstandard is None:
+            raise ValueError(f"Reading {path} requires the zstandard package")
+        # every batch is a separate frame
+        f = io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(
+                open(path, "rb"), read_across_frames=True
+            )
+        )
+    else:
+        f = open(path, "rb")
+
+    with f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # the last line of an interrupted export can be incomplete
+                    logger.warning(f"Skipping incomplete line in {path}")
+        except _TRUNCATION_ERRORS as e:
+            logger.warning(
+                f"{path} is truncated, read up to the last complete batch: {e}"
+            )
@@ -1,7 +1,8 @@
 import logging
 import json
-
-from utils import vlq_decode_little_endian
+import re
+import struct
+import sys
 
 from constants import (
     MARKETPLACE_RESPONSE_HEADER,
@@ -25,206 +26,799 @@ class Item:
         if self.payload is None:
             return
 
-        id_start = self.__parse_header()
-        name_end = self.__parse_item_id(id_start)
-        stack_count_end = self.__parse_stack_count(name_end)
-        item_properties_end = self.__parse_item_properties(stack_count_end)
-        loot_state_end = self.__parse_loot_state(item_properties_end)
-        found_by_end = self.__parse_found_by(loot_state_end)
-        price_end = self.__parse_price(found_by_end)
-        ts_end = self.__parse_ts(price_end)
-        self.__parse_sold_by(ts_end)
-
-    def __parse_header(self):
-        id_start = self.payload.find(H_ITEM_ID)
-        if id_start == -1:
-            raise ValueError("ID not found in item payload")
-
-        # These are unknown bytes that appear before the item ID.
-        self.header_bytes = self.payload[0:id_start]
-        return id_start
-
-    def __parse_item_id(self, start_index):
-        id_end = start_index + len(H_ITEM_ID)
-        name_end = self.payload.find(b"\x18", id_end)
-        if name_end == -1:
-            raise ValueError("name not found in item payload")
-
-        id = self.payload[id_end:name_end]
-
-        # ID is a combination of name and rarity, separated by _
-        spl = id.split(b"_")
-
-        if len(spl) == 2:
-            self.name = spl[0].decode("utf-8")
-            self.rarity = rarity_str(spl[1].decode("utf-8"))
-        else:
-            # no rarity present
-            self.name = spl[0].decode("utf-8")
-            self.rarity = rarity_str(None)
+        data, view = searchable(self.payload)
+        decode_item(data, view, 0, len(data), self)
 
-        return name_end
+    def __getstate__(self):
+        return _picklable(self.__dict__)
 
-    def __parse_stack_count(self, start_index):
-        if self.payload[start_index : start_index + 1] != b"\x18":
-            raise ValueError("stack count not found in item payload")
+    @classmethod
+    def from_dict(cls, data):
+        item = cls(None)
+        item.name = data.get("name")
+        item.rarity = data.get("rarity")
+        item.stack_count = data.get("stack_count")
+        item.properties = data.get("properties", {})
+        item.loot_state = data.get("loot_state")
+        item.found_by_name = data.get("found_by_name")
+        item.found_by_tag = data.get("found_by_tag")
+        item.sold_by_name = data.get("sold_by_name")
+        item.sold_by_tag = data.get("sold_by_tag")
+        item.sold_by_leaderboard_rank = data.get("sold_by_leaderboard_rank")
+        item.price = data.get("price")
+        # listings submitted for prediction may not have an expiry
+        expiry_ts = data.get("expiry_ts")
+        item.expiry_ts = datetime.fromisoformat(expiry_ts) if expiry_ts else None
+        return item
 
-        # stack count is a single byte after the 0x18 byte
-        self.stack_count = int(
-            self.payload[start_index + 1 : start_index + 2].hex(), 16
-        )
+    def dict(self):
+        return {
+            "name": self.name,
+            "rarity": self.rarity,
+            "stack_count": self.stack_count,
+            "properties": self.properties,
+            "loot_state": self.loot_state,
+            "found_by_name": (
+                self.found_by_name if hasattr(self, "found_by_name") else None
+            ),
+            "found_by_tag": (
+                self.found_by_tag if hasattr(self, "found_by_tag") else None
+            ),
+            "sold_by_name": self.sold_by_name,
+            "sold_by_tag": self.sold_by_tag,
+            "sold_by_leaderboard_rank": (
+                self.sold_by_leaderboard_rank
+                if hasattr(self, "sold_by_leaderboard_rank")
+                else None
+            ),
+            "price": self.price,
+            "expiry_ts": self.expiry_ts.isoformat(),
+        }
 
-        if self.payload[start_index + 2 : start_index + 3] != b" ":
-            raise ValueError("stack count terminator not found in item payload")
 
-        return start_index + 3
+class MarketplaceResponse:
+    def __init__(
+        self,
+        payload: bytearray | memoryview,
+        lazy: bool = False,
+        compact: bool = False,
+        keep_payload: bool = True,
+    ):
+        self.payload = payload
+        self.lazy = lazy  # decode item fields on first access instead of up front
+        self.compact = compact  # decode items into CompactItem
+        self.keep_payload = keep_payload  # keep each compact item's view of the payload
+        self.items = []
+        self.__validate()
+        self.__parse()
 
-    def __parse_item_properties(self, start_index):
-        end_index = start_index
+    def __parse(self):
+        (
+            self.header_bytes,
+            self.items,
+            self.page_number,
+            self.total_pages,
+        ) = decode_response(self.payload, self.lazy, self.compact, self.keep_payload)
 
-        property_start = self.payload.find(H_ITEM_PROPERTY, start_index)
-        while property_start != -1:
-            end_index = self.__parse_item_property(property_start)
-            property_start = self.payload.find(H_ITEM_PROPERTY, end_index)
+    def __validate(self):
+        if not self.payload:
+            raise ValueError("Payload cannot be None")
 
-        return end_index
+        if not begins_marketplace_response(self.payload):
+            raise ValueError("Payload does not begin with marketplace response header")
 
-    def __parse_item_property(self, start_index):
-        property_name_end = self.payload.find(
-            b"\x10",
-            start_index + len(H_ITEM_PROPERTY),
-        )
+        if not ends_marketplace_response(self.payload):
+            raise ValueError("Payload does not end with marketplace response footer")
 
-        property_name = self.payload[
-            start_index + len(H_ITEM_PROPERTY) : property_name_end
-        ].decode("utf-8")
+        return True
 
-        # payload[property_name_end:property_name_end + 1] is a delimiter between the name and the value (\x10)
+    def __getstate__(self):
+        return _picklable(self.__dict__)
 
-        property_value = int(
-            self.payload[property_name_end + 1 : property_name_end + 2].hex(), 16
+    def dump(self):
+        return json.dumps(
+            {
+                "items": [item.dict() for item in self.items],
+                "page_number": self.page_number,
+                "total_pages": self.total_pages,
+            },
+            indent=4,
         )
 
-        x = property_name_end + 2
 
-        # If the value is negative, it is represented as a 2's complement
-        if self.payload[x : x + 1] == b"\xff":
-            property_value = property_value - 256
+# there are 22 currently unknown bytes at the start of each item.
+UNKNOWN_BYTE_COUNT = 22
 
-            # consume extra bytes when 2's complement is used
-            while self.payload[x : x + 1] == b"\xff":
-                x += 1
-            if self.payload[x : x + 1] == b"\x01":
-                x += 1
+_FOUND_BY = b"\x60\x01\x6a"
 
-        # save the property data in the properties dictionary
-        self.properties[property_name] = property_value
+# runs of bytes matched from the cursor position, equivalent to stepping with bytes.isalnum
+_ALNUM_RUN = re.compile(b"[0-9A-Za-z]*")
+_NON_ALNUM_RUN = re.compile(b"[^0-9A-Za-z]*")
+_TAG_RUN = re.compile(b"[0-9A-Za-z#]*")
 
-        next_property_start = self.payload.find(H_ITEM_PROPERTY, x + 1)
+# The decoder walks each item once with a cursor over `data`.
+# Searches use find and match with start/end bounds, so the buffer is never sliced.
+# Only the short text fields are sliced to decode them, which is faster than decoding a memoryview.
 
-        return next_property_start if next_property_start != -1 else x
 
-    def __parse_loot_state(self, start_index):
-        if self.payload[start_index : start_index + 1] == b"\x58":
-            logger.debug("loot state present.")
-            self.loot_state = loot_state_str(
-                int(self.payload[start_index + 1 : start_index + 2].hex(), 16)
-            )
-            return start_index + 2
+def _vlq(data, start: int, end: int) -> int | None:
+    """
+    Decode a little endian VLQ from data[start:end], as utils.vlq_decode_little_endian does.
+    """
+    value = 0
+    shift = 0
+    for i in range(start, end):
+        byte = data[i]
+
+        # Check if the MSB is set (indicating continuation)
+        if byte & 0x80:
+            value |= (byte & 0x7F) << shift
+            shift += 7
         else:
-            logger.debug("loot state not present.")
-            self.loot_state = None
-            return start_index
+            return value | (byte << shift)
 
-    def __parse_found_by(self, start_index):
-        price_start = self.payload.find(b"\x18", start_index)
+    return None
 
-        if self.payload[start_index : start_index + 3].hex() == "60016a":
-            logger.debug("found by present.")
 
-            x = start_index + 3
-            # Consume bytes until reaching an alphanumeric character
-            while x < price_start and not self.payload[x : x + 1].isalnum():
-                x += 1
+def _decode_header(item, data, view: memoryview, pos: int, end: int, now) -> int:
+    id_start = data.find(H_ITEM_ID, pos, end)
+    if id_start == -1:
+        raise ValueError("ID not found in item payload")
 
-            # Consume bytes until reaching a non alphanumeric character
-            y = x
-            while y < price_start and self.payload[y : y + 1].isalnum():
-                y += 1
+    # These are unknown bytes that appear before the item ID.
+    item.header_bytes = view[pos:id_start]
+    return id_start
 
-            # there is an r at the end of each found by name that needs to be removed
-            self.found_by_name = self.payload[x : y - 1].decode("utf-8")
 
-            self.found_by_tag = self.payload[y + 1 : price_start].decode("utf-8")
+def _scan_item_id(data, pos: int, end: int) -> tuple:
+    """
+    Locate the parts of the item ID at data[pos].
 
-            return price_start
-        else:
-            logger.debug("found by not present.")
-            return start_index
+    Returns the (name end, rarity start, id end) offsets; rarity start is None when the ID
+    has no rarity.
+    """
+    id_start = pos + len(H_ITEM_ID)
+    id_end = data.find(b"\x18", id_start, end)
+    if id_end == -1:
+        raise ValueError("name not found in item payload")
 
-    def __parse_price(self, start_index):
-        if self.payload[start_index : start_index + 1] != b"\x18":
-            logger.debug(
-                "price not found where expected: trying to consume some extra unknown bytes"
-            )
-            start_index = self.payload.find(b"\x18", start_index)
+    # ID is a combination of name and rarity, separated by _
+    separator = data.find(b"_", id_start, id_end)
+    if separator == -1:
+        # no rarity present
+        return id_end, None, id_end
+
+    if data.find(b"_", separator + 1, id_end) == -1:
+        return separator, separator + 1, id_end
+
+    return separator, None, id_end
+
+
+def _decode_item_id(item, data, view: memoryview, pos: int, end: int, now) -> int:
+    name_end, rarity_start, id_end = _scan_item_id(data, pos, end)
 
-            if start_index == -1:
-                raise ValueError("price not found in item payload")
+    item.name = data[pos + len(H_ITEM_ID) : name_end].decode("utf-8")
+    item.rarity = rarity_str(
+        None if rarity_start is None else data[rarity_start:id_end].decode("utf-8")
+    )
 
-        price_end = self.payload.find(b"\x20", start_index)
-        if price_end == -1:
-            raise ValueError("price end not found in item payload")
+    return id_end
 
-        self.price = vlq_decode_little_endian(self.payload[start_index + 1 : price_end])
 
-        return price_end
+def _scan_stack_count(data, pos: int, end: int) -> int:
+    """
+    Check the stack count at data[pos]. Returns the offset after it.
+    """
+    # stack count is a single byte after the 0x18 byte
+    if pos + 1 >= end or data[pos] != 0x18:
+        raise ValueError("stack count not found in item payload")
+
+    if pos + 2 >= end or data[pos + 2] != 0x20:
+        raise ValueError("stack count terminator not found in item payload")
+
+    return pos + 3
+
+
+def _decode_stack_count(item, data, view: memoryview, pos: int, end: int, now) -> int:
+    end_index = _scan_stack_count(data, pos, end)
+    item.stack_count = data[pos + 1]
+    return end_index
+
+
+def _decode_item_properties(
+    item, data, view: memoryview, pos: int, end: int, now
+) -> int:
+    properties = {}
+    end_index = pos
+
+    property_start = data.find(H_ITEM_PROPERTY, pos, end)
+    while property_start != -1:
+        end_index = _decode_item_property(properties, data, property_start, end)
+        property_start = data.find(H_ITEM_PROPERTY, end_index, end)
+
+    # assigned once so item types can store properties in their own layout
+    item.properties = properties
+    return end_index
 
-    def __parse_ts(self, start_index):
-        ms = vlq_decode_little_endian(self.payload[start_index + 1 : start_index + 6])
-        self.expiry_ts = datetime.now() + timedelta(milliseconds=ms)
-        return start_index + 6
 
-    def __parse_sold_by(self, start_index):
-        sold_by_end = self.payload.find(b"\x12", start_index)
+def _skip_item_properties(item, data, view: memoryview, pos: int, end: int, now) -> int:
+    """
+    Find the end of the properties section without decoding it.
+    Walking from the last property gives the same end offset as walking through every property.
+    """
+    item._properties_start = pos
+
+    property_start = data.rfind(H_ITEM_PROPERTY, pos, end)
+    if property_start == -1:
+        return pos
+
+    return _scan_item_property(data, property_start, end)[2]
+
+
+def _scan_item_property(data, pos: int, end: int) -> tuple:
+    """
+    Locate the parts of the property at data[pos].
+
+    Returns the (name start, name end, end) offsets of the property.
+    """
+    property_name_start = pos + len(H_ITEM_PROPERTY)
+    property_name_end = data.find(b"\x10", property_name_start, end)
+    if property_name_end == -1 or property_name_end + 1 >= end:
+        raise ValueError("property value not found in item payload")
 
-        # first 2 bytes are unknown but resolve to characters so we skip those manually
-        x = start_index + 2
+    # data[property_name_end] is a delimiter between the name and the value (\x10)
+    x = property_name_end + 2
 
-        # consume any extra unknown bytes until we reach an alphanumeric characters
-        while x < sold_by_end and not self.payload[x : x + 1].isalnum():
+    # negative values are followed by extra 2's complement bytes
+    if x < end and data[x] == 0xFF:
+        while x < end and data[x] == 0xFF:
             x += 1
+        if x < end and data[x] == 0x01:
+            x += 1
+
+    return property_name_start, property_name_end, x
+
+
+def _decode_item_property(properties: dict, data, pos: int, end: int) -> int:
+    property_name_start, property_name_end, x = _scan_item_property(data, pos, end)
+
+    property_name = data[property_name_start:property_name_end].decode("utf-8")
+    property_value = data[property_name_end + 1]
+
+    # If the value is negative, it is represented as a 2's complement
+    if data[property_name_end + 2 : property_name_end + 3] == b"\xff":
+        property_value = property_value - 256
+
+    properties[property_name] = property_value
+    return x
+
+
+def _scan_loot_state(data, pos: int, end: int) -> int:
+    """
+    Check the optional loot state at data[pos]. Returns the offset after it.
+    """
+    if pos < end and data[pos] == 0x58:
+        if pos + 1 >= end:
+            raise ValueError("loot state not found in item payload")
+        return pos + 2
+
+    return pos
+
+
+def _decode_loot_state(item, data, view: memoryview, pos: int, end: int, now) -> int:
+    end_index = _scan_loot_state(data, pos, end)
+    item.loot_state = loot_state_str(data[pos + 1]) if end_index != pos else None
+    return end_index
+
+
+def _scan_found_by(data, pos: int, end: int) -> tuple | None:
+    """
+    Locate the parts of the found by section at data[pos].
+
+    Returns the (name start, tag start, price start) offsets, or None if the item has no
+    found by section.
+    """
+    if data[pos : pos + 3] != _FOUND_BY:
+        return None
+
+    price_start = data.find(b"\x18", pos, end)
+    if price_start == -1:
+        raise ValueError("price not found in item payload")
+
+    # Consume bytes until reaching an alphanumeric character
+    x = _NON_ALNUM_RUN.match(data, pos + 3, price_start).end()
+
+    # Consume bytes until reaching a non alphanumeric character
+    y = _ALNUM_RUN.match(data, x, price_start).end()
+
+    return x, y, price_start
+
+
+def _decode_found_by(item, data, view: memoryview, pos: int, end: int, now) -> int:
+    found_by = _scan_found_by(data, pos, end)
+    if found_by is None:
+        return pos
+
+    x, y, price_start = found_by
+
+    # there is an r at the end of each found by name that needs to be removed
+    item.found_by_name = data[x : max(x, y - 1)].decode("utf-8")
+    item.found_by_tag = data[y + 1 : price_start].decode("utf-8")
+
+    return price_start
+
+
+def _scan_price(data, pos: int, end: int) -> tuple:
+    """
+    Locate the price VLQ at or after data[pos].
+
+    Returns the (price start, price end) offsets of the VLQ bytes.
+    """
+    if pos >= end or data[pos] != 0x18:
+        # price not found where expected: consume some extra unknown bytes
+        pos = data.find(b"\x18", pos, end)
+        if pos == -1:
+            raise ValueError("price not found in item payload")
+
+    price_end = data.find(b"\x20", pos, end)
+    if price_end == -1:
+        raise ValueError("price end not found in item payload")
+
+    return pos + 1, price_end
+
+
+def _decode_price(item, data, view: memoryview, pos: int, end: int, now) -> int:
+    price_start, price_end = _scan_price(data, pos, end)
+    item.price = _vlq(data, price_start, price_end)
+    return price_end
 
-        self.sold_by_name = self.payload[x:sold_by_end].decode("utf-8")
 
-        # self.payload[sold_by_end:sold_by_end + 1] is a 1 byte separator ( potentially unknown data )
+def _decode_ts(item, data, view: memoryview, pos: int, end: int, now) -> int:
+    ms = _vlq(data, pos + 1, min(pos + 6, end))
+    if ms is None:
+        raise ValueError("expiry not found in item payload")
 
-        # consume bytes to find the first non-alphanumeric character
-        y = sold_by_end + 2
-        while (
-            y < len(self.payload)
-            and self.payload[y : y + 1].isalnum()
-            or self.payload[y : y + 1] == b"#"
-        ):
-            y += 1
+    item.expiry_ts = now + timedelta(milliseconds=ms)
+    return pos + 6
+
+
+def _scan_sold_by(data, pos: int, end: int) -> int:
+    """
+    Locate the end of the seller name at or after data[pos].
+    """
+    sold_by_end = data.find(b"\x12", pos, end)
+    if sold_by_end == -1:
+        raise ValueError("sold by not found in item payload")
+    return sold_by_end
+
+
+def _decode_sold_by(item, data, view: memoryview, pos: int, end: int, now) -> int:
+    sold_by_end = _scan_sold_by(data, pos, end)
+
+    # first 2 bytes are unknown but resolve to characters so we skip those manually
+    x = pos + 2
+
+    # consume any extra unknown bytes until we reach an alphanumeric characters
+    x = _NON_ALNUM_RUN.match(data, x, sold_by_end).end() if x < sold_by_end else x
+
+    item.sold_by_name = data[x:sold_by_end].decode("utf-8")
+
+    # data[sold_by_end] is a 1 byte separator ( potentially unknown data )
+
+    # consume bytes to find the first non-alphanumeric character
+    y = sold_by_end + 2
+    y = _TAG_RUN.match(data, y, end).end() if y < end else y
+
+    item.sold_by_tag = data[sold_by_end + 2 : y].decode("utf-8")
+
+    leaderboard_start = data.find(H_LEADERBOARD_RANK, y, end)
+    if leaderboard_start == -1:
+        return y
+
+    item.sold_by_leaderboard_rank = data[
+        leaderboard_start + len(H_LEADERBOARD_RANK) : end
+    ].decode("utf-8")
+    return end
+
+
+def scan_item(data, start: int, end: int):
+    """
+    Check that every section of the item in data[start:end] can be found, without decoding it.
+
+    Raises the ValueError decode_item would, so a lazily decoded response still rejects a
+    malformed item when it is parsed rather than when a field is first read.
+    """
+    pos = data.find(H_ITEM_ID, start, end)
+    if pos == -1:
+        raise ValueError("ID not found in item payload")
 
-        self.sold_by_tag = self.payload[sold_by_end + 2 : y].decode("utf-8")
+    pos = _scan_stack_count(data, _scan_item_id(data, pos, end)[2], end)
 
-        leaderboard_start = self.payload.find(H_LEADERBOARD_RANK, y)
+    property_start = data.find(H_ITEM_PROPERTY, pos, end)
+    while property_start != -1:
+        pos = _scan_item_property(data, property_start, end)[2]
+        property_start = data.find(H_ITEM_PROPERTY, pos, end)
 
-        if leaderboard_start == -1:
-            logger.debug("leaderboard rank not found.")
-            return start_index
+    pos = _scan_loot_state(data, pos, end)
 
-        self.sold_by_leaderboard_rank = self.payload[
-            leaderboard_start + len(H_LEADERBOARD_RANK) :
-        ].decode("utf-8")
+    found_by = _scan_found_by(data, pos, end)
+    if found_by is not None:
+        pos = found_by[2]
 
-        return len(self.payload)
+    pos = _scan_price(data, pos, end)[1]
+    if _vlq(data, pos + 1, min(pos + 6, end)) is None:
+        raise ValueError("expiry not found in item payload")
+
+    _scan_sold_by(data, pos + 6, end)
+
+
+# the sections of an item, in the order they appear in the payload
+ITEM_DECODE_STEPS = (
+    _decode_header,
+    _decode_item_id,
+    _decode_stack_count,
+    _decode_item_properties,
+    _decode_loot_state,
+    _decode_found_by,
+    _decode_price,
+    _decode_ts,
+    _decode_sold_by,
+)
+
+
+def searchable(payload) -> tuple:
+    """
+    Return a (data, view) pair for a payload.
+
+    `data` supports find() and `view` is a memoryview over the same bytes. A memoryview that
+    spans its whole buffer, as handed over by the reassembler, is searched in place; any other
+    view is copied once.
+    """
+    view = memoryview(payload)
+    if isinstance(payload, (bytes, bytearray)):
+        return payload, view
+
+    obj = view.obj
+    if isinstance(obj, (bytes, bytearray)) and view.nbytes == len(obj):
+        return obj, view
+
+    data = view.tobytes()
+    return data, memoryview(data)
+
+
+def decode_item(
+    data, view: memoryview, start: int, end: int, item: Item = None, now=None
+) -> Item:
+    """
+    Decode the item in data[start:end] with a single forward pass of a cursor.
+    No bytes are copied; the item keeps views into the response buffer.
+    """
+    if item is None:
+        item = Item(None)
+        item.payload = view[start:end]
+
+    if now is None:
+        now = datetime.now()
+
+    pos = start
+    for step in ITEM_DECODE_STEPS:
+        pos = step(item, data, view, pos, end, now)
+
+    return item
+
+
+def item_boundaries(data, footer_start: int) -> list:
+    """
+    Find the (start, end) offsets of every item in a response.
+    """
+    boundaries = []
+
+    # data[2:6] is the marketplace response header
+    item_start = data.find(H_ITEM_ID, 6)
+    if item_start != -1:
+        item_start -= UNKNOWN_BYTE_COUNT
+
+    while item_start != -1:
+        next_item_start = data.find(
+            H_ITEM_ID, item_start + UNKNOWN_BYTE_COUNT + len(H_ITEM_ID)
+        )
+        if next_item_start == -1:
+            # the last item runs up to the footer
+            boundaries.append((item_start, footer_start))
+            break
+
+        boundaries.append((item_start, next_item_start - UNKNOWN_BYTE_COUNT))
+        item_start = next_item_start - UNKNOWN_BYTE_COUNT
+
+    return boundaries
+
+
+def decode_response(
+    payload, lazy: bool = False, compact: bool = False, keep_payload: bool = True
+) -> tuple:
+    """
+    Decode a marketplace response payload.
+
+    When lazy is set only the item boundaries are found; each LazyItem decodes its
+    fields the first time they are accessed.
+    When compact is set items are decoded into CompactItems, which drop their views of
+    the response buffer unless keep_payload is set.
+
+    Returns a tuple of (header bytes, items, page number, total pages).
+    """
+    if lazy and compact:
+        raise ValueError("Lazy decoding can't be combined with compact items")
+
+    data, view = searchable(payload)
+    size = len(data)
+    now = datetime.now()
+
+    footer_start, page_number_size, total_pages_size = calculate_footer(view)
+    footer_start += size
+
+    if lazy:
+        items = [
+            LazyItem(data, view, start, end, now)
+            for start, end in item_boundaries(data, footer_start)
+        ]
+    elif compact:
+        items = [
+            decode_item(data, view, start, end, CompactItem(), now).compact(
+                view[start:end] if keep_payload else None
+            )
+            for start, end in item_boundaries(data, footer_start)
+        ]
+    else:
+        items = [
+            decode_item(data, view, start, end, now=now)
+            for start, end in item_boundaries(data, footer_start)
+        ]
+
+    page_number = _vlq(data, footer_start + 1, footer_start + 1 + page_number_size)
+    total_pages = _vlq(data, size - total_pages_size, size)
+
+    # unknown 2 bytes to start the message
+    return view[:2], items, page_number, total_pages
+
+
+# the sections of an item as decoded by LazyItem; properties are skipped over until they are needed
+LAZY_ITEM_DECODE_STEPS = (
+    ITEM_DECODE_STEPS[:3] + (_skip_item_properties,) + ITEM_DECODE_STEPS[4:]
+)
+
+# the number of lazy decode steps needed before each field is available
+_LAZY_FIELD_STEPS = {
+    "header_bytes": 1,
+    "name": 2,
+    "rarity": 2,
+    "stack_count": 3,
+    "loot_state": 5,
+    "found_by_name": 6,
+    "found_by_tag": 6,
+    "price": 7,
+    "expiry_ts": 8,
+    "sold_by_name": 9,
+    "sold_by_tag": 9,
+    "sold_by_leaderboard_rank": 9,
+}
+
+
+class LazyItem(Item):
+    """
+    An item that decodes its payload on demand.
+
+    Fields are decoded in payload order the first time one of them is accessed and then
+    cached as ordinary attributes, so reading `name` and `rarity` never touches the price
+    or seller sections, and properties are only decoded when `properties` is read.
+    The item's sections are located when it is created, so a malformed item fails the
+    response when it is parsed, as it does when decoding eagerly.
+    dict() always decodes the whole item.
+    """
+
+    def __init__(self, data, view: memoryview, start: int, end: int, now: datetime):
+        scan_item(data, start, end)
+
+        self.payload = view[start:end]
+        self._data = data
+        self._view = view
+        self._pos = start
+        self._end = end
+        self._now = now
+        self._step = 0
+
+    def __getattr__(self, name):
+        # only called for attributes that haven't been decoded yet
+        if name == "properties":
+            self.__decode_to(4)
+            _decode_item_properties(
+                self,
+                self._data,
+                self._view,
+                self._properties_start,
+                self._end,
+                self._now,
+            )
+            return self.properties
+
+        target = _LAZY_FIELD_STEPS.get(name)
+        if target is None or self._step >= target:
+            raise AttributeError(name)
+
+        self.__decode_to(target)
+
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            # optional sections such as found by are not present in every item
+            raise AttributeError(name) from None
+
+    def __decode_to(self, target: int):
+        if self._step >= target:
+            return
+
+        data, view, end, now = self._data, self._view, self._end, self._now
+        pos = self._pos
+        for step in LAZY_ITEM_DECODE_STEPS[self._step : target]:
+            pos = step(self, data, view, pos, end, now)
+            self._step += 1
+        self._pos = pos
+
+    def decode(self):
+        """
+        Decode every remaining field.
+        """
+        self.__decode_to(len(LAZY_ITEM_DECODE_STEPS))
+
+        # properties are decoded separately from the other sections
+        if "properties" not in self.__dict__:
+            self.__getattr__("properties")
+
+    def dict(self):
+        self.decode()
+        return super().dict()
+
+    def __getstate__(self):
+        # the response buffer isn't pickled, so everything has to be decoded first
+        self.decode()
+        state = super().__getstate__()
+        del state["_data"], state["_view"]
+        return state
+
+
+class Vocabulary:
+    """
+    Assigns a small integer id to every distinct string.
+    Shared by all compact items so each property name is stored once.
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.id(name)
+
+    def id(self, name: str) -> int:
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name = sys.intern(name)
+            name_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def __len__(self):
+        return len(self.names)
+
+
+PROPERTY_VOCABULARY = Vocabulary()
+
+_PROPERTY = struct.Struct("<Hh")
+
+
+class CompactItem:
+    """
+    A memory-efficient item for holding large numbers of listings.
+
+    Uses __slots__ instead of a per-instance dict, interns names, and packs properties into
+    (property id, value) pairs against the shared PROPERTY_VOCABULARY.
+    Optional sections that aren't present are None rather than missing.
+    """
+
+    __slots__ = (
+        "payload",
+        "header_bytes",
+        "name",
+        "rarity",
+        "stack_count",
+        "packed_properties",
+        "loot_state",
+        "found_by_name",
+        "found_by_tag",
+        "price",
+        "expiry_ts",
+        "sold_by_name",
+        "sold_by_tag",
+        "sold_by_leaderboard_rank",
+        "predicted_price",
+        "discount",
+    )
+
+    vocabulary = PROPERTY_VOCABULARY
+
+    def __init__(self):
+        self.payload = None
+        self.header_bytes = None
+        self.name = None
+        self.rarity = None
+        self.stack_count = None
+        self.packed_properties = b""
+        self.loot_state = None
+        self.found_by_name = None
+        self.found_by_tag = None
+        self.price = 0
+        self.expiry_ts = None
+        self.sold_by_name = None
+        self.sold_by_tag = None
+        self.sold_by_leaderboard_rank = None
+        self.predicted_price = None  # set when the item is scored by a price model
+        self.discount = None
+
+    @property
+    def properties(self) -> dict:
+        names = self.vocabulary.names
+        return {
+            names[property_id]: value
+            for property_id, value in _PROPERTY.iter_unpack(self.packed_properties)
+        }
+
+    @properties.setter
+    def properties(self, properties: dict):
+        vocabulary = self.vocabulary
+        self.packed_properties = b"".join(
+            _PROPERTY.pack(vocabulary.id(name), value)
+            for name, value in properties.items()
+        )
+
+    def compact(self, payload: memoryview | None = None):
+        """
+        Intern the decoded strings and replace the views of the response buffer.
+        Without a payload the item no longer keeps the response buffer alive.
+        """
+        self.payload = payload
+        self.header_bytes = None if payload is None else self.header_bytes
+        self.name = sys.intern(self.name)
+        if self.found_by_name is not None:
+            self.found_by_name = sys.intern(self.found_by_name)
+        if self.sold_by_name is not None:
+            self.sold_by_name = sys.intern(self.sold_by_name)
+        if self.sold_by_leaderboard_rank is not None:
+            self.sold_by_leaderboard_rank = sys.intern(self.sold_by_leaderboard_rank)
+        return self
+
+    def __getstate__(self):
+        # property ids are only meaningful within this process, so properties go by name
+        state = {field: getattr(self, field) for field in self.__slots__}
+        state["packed_properties"] = self.properties
+        return _picklable(state)
+
+    def __setstate__(self, state: dict):
+        for field, value in state.items():
+            if field != "packed_properties":
+                setattr(self, field, value)
+        self.properties = state["packed_properties"]
+        self.compact(self.payload)
+
+    @classmethod
+    def from_item(cls, item: Item, keep_payload: bool = False):
+        compact_item = cls()
+        for field in cls.__slots__:
+            if field != "packed_properties":
+                setattr(compact_item, field, getattr(item, field, None))
+        compact_item.properties = item.properties
+        return compact_item.compact(item.payload if keep_payload else None)
 
     @classmethod
     def from_dict(cls, data):
-        item = cls(None)
+        item = cls()
         item.name = data.get("name")
         item.rarity = data.get("rarity")
         item.stack_count = data.get("stack_count")
@@ -236,8 +830,10 @@ class Item:
         item.sold_by_tag = data.get("sold_by_tag")
         item.sold_by_leaderboard_rank = data.get("sold_by_leaderboard_rank")
         item.price = data.get("price")
-        item.expiry_ts = datetime.fromisoformat(data.get("expiry_ts"))
-        return item
+        # listings submitted for prediction may not have an expiry
+        expiry_ts = data.get("expiry_ts")
+        item.expiry_ts = datetime.fromisoformat(expiry_ts) if expiry_ts else None
+        return item.compact()
 
     def dict(self):
         return {
@@ -246,95 +842,25 @@ class Item:
             "stack_count": self.stack_count,
             "properties": self.properties,
             "loot_state": self.loot_state,
-            "found_by_name": (
-                self.found_by_name if hasattr(self, "found_by_name") else None
-            ),
-            "found_by_tag": (
-                self.found_by_tag if hasattr(self, "found_by_tag") else None
-            ),
+            "found_by_name": self.found_by_name,
+            "found_by_tag": self.found_by_tag,
             "sold_by_name": self.sold_by_name,
             "sold_by_tag": self.sold_by_tag,
-            "sold_by_leaderboard_rank": (
-                self.sold_by_leaderboard_rank
-                if hasattr(self, "sold_by_leaderboard_rank")
-                else None
-            ),
+            "sold_by_leaderboard_rank": self.sold_by_leaderboard_rank,
             "price": self.price,
             "expiry_ts": self.expiry_ts.isoformat(),
         }
 
 
-class MarketplaceResponse:
-    def __init__(self, payload: bytearray):
-        self.payload = payload
-        self.items = []
-        self.__validate()
-        self.__parse()
-
-    def __parse(self):
-        # there are 22 currently unknown bytes at the start of each item.
-        UNKNOWN_BYTE_COUNT = 22
-
-        # unknown 2 bytes to start the message
-        self.header_bytes = self.payload[:2]
-
-        # self.payload[2:6] is the marketplace response header
-
-        # Convert the search string to bytes
-        item_start = self.payload.find(H_ITEM_ID, 6)
-
-        if item_start != -1:
-            item_start -= UNKNOWN_BYTE_COUNT
-
-        while item_start != -1:
-            next_item_start = self.payload.find(
-                H_ITEM_ID, item_start + UNKNOWN_BYTE_COUNT + len(H_ITEM_ID)
-            )
-            if next_item_start == -1:
-                # no more items after this one
-                break
-
-            self.items.append(
-                Item(self.payload[item_start : next_item_start - UNKNOWN_BYTE_COUNT])
-            )
-
-            # prep the next loop
-            item_start = next_item_start - UNKNOWN_BYTE_COUNT
-
-        footer_start, page_number_size, total_pages_size = calculate_footer(
-            self.payload
-        )
-
-        if item_start != -1:
-            self.items.append(Item(self.payload[item_start:footer_start]))
-
-        self.page_number = vlq_decode_little_endian(
-            self.payload[footer_start + 1 : footer_start + 1 + page_number_size]
-        )
-
-        self.total_pages = vlq_decode_little_endian(self.payload[-total_pages_size:])
-
-    def __validate(self):
-        if not self.payload:
-            raise ValueError("Payload cannot be None")
-
-        if not begins_marketplace_response(self.payload):
-            raise ValueError("Payload does not begin with marketplace response header")
-
-        if not ends_marketplace_response(self.payload):
-            raise ValueError("Payload does not end with marketplace response footer")
-
-        return True
-
-    def dump(self):
-        return json.dumps(
-            {
-                "items": [item.dict() for item in self.items],
-                "page_number": self.page_number,
-                "total_pages": self.total_pages,
-            },
-            indent=4,
-        )
+def _picklable(state: dict) -> dict:
+    """
+    Copy an object's state with views of the response buffer replaced by bytes, so it can be
+    sent to another process.
+    """
+    return {
+        name: value.tobytes() if isinstance(value, memoryview) else value
+        for name, value in state.items()
+    }
 
 
 def begins_marketplace_response(payload: bytearray) -> bool:
@@ -360,7 +886,7 @@ def ends_marketplace_response(payload: bytearray) -> bool:
     if payload is None:
         return False
 
-    if len(payload.hex()) < 8:  # Minimum length to contain the pattern
+    if len(payload) < 4:  # Minimum length to contain the pattern
         return False
 
     # Check for the end pattern
@@ -381,6 +907,35 @@ def ends_marketplace_response(payload: bytearray) -> bool:
     return False
 
 
+def is_complete_response(data, end: int) -> bool:
+    """
+    Checks if data[:end] is a whole marketplace response rather than a prefix of one.
+
+    The footer alone can't tell: a response can be cut anywhere, including right after bytes
+    that happen to look like a footer. Only the last item can be cut short, so it has to be
+    found whole up to the footer as well.
+    """
+    # the total pages end the response; a last byte with the continuation bit set is cut off
+    if end == 0 or data[end - 1] & 0x80:
+        return False
+
+    footer = calculate_footer(bytes(data[max(0, end - 8) : end]))
+    if footer is None:
+        return False
+    footer_start = end + footer[0]
+
+    last_item = data.rfind(H_ITEM_ID, 6, footer_start)
+    if last_item == -1:
+        # a page without items is only a header and a footer
+        return True
+
+    try:
+        scan_item(data, last_item - UNKNOWN_BYTE_COUNT, footer_start)
+    except ValueError:
+        return False
+    return True
+
+
 def calculate_footer(payload):
     """
     Checks if the payload contains the end bytes of a marketplace response.
@@ -1,17 +1,14 @@
+import asyncio
 import logging
-import pyshark
 import threading
-import asyncio
-
-from pyshark.packet.packet import Packet
 
 from dataclasses import dataclass
 
-from shark.marketplace_response import (
-    MarketplaceResponse,
-    begins_marketplace_response,
-    ends_marketplace_response,
-)
+from shark.marketplace_response import MarketplaceResponse
+from shark.capture import create_capture
+from shark.parse_pool import ParsePool
+from shark.reassembly import TcpReassembler
+from shark.segment import TcpSegment
 from config import MONITORED_IPS
 from constants import KEEP_ALIVE_RESPONSE
 
@@ -20,41 +17,71 @@ logger = logging.getLogger(__name__)
 
 @dataclass
 class PacketMonitorConfig:
-    interface: str  # The local network interface to listen on
+    interface: str  # The local network interface to listen on, None when replaying
     bpf_filter: str  # The BPF filter to apply to the network interface
+    backend: str = "pyshark"  # The capture backend to read packets with
+    reassembly_timeout: float = 10.0  # Seconds before an incomplete response is dropped
+    reassembly_max_bytes: int = 64 * 1024 * 1024  # Byte budget for incomplete responses
+    lazy_decoding: bool = False  # Decode item fields on first access
+    compact_items: bool = False  # Keep items as CompactItem without their raw payload
+    parse_workers: int = 0  # Workers parsing off the capture thread, 0 to parse inline
+    parse_executor: str = "thread"  # Run the parse workers as threads or processes
+    parse_queue_size: int = 256  # Responses queued before new ones are dropped
+    keep_responses: bool = True  # Keep every parsed response in memory for later export
 
 
 class PacketMonitor:
     def __init__(self, config: PacketMonitorConfig):
         self.interface = config.interface
         self.bpf_filter = config.bpf_filter
-        self.ack_map = {}
+        self.backend = config.backend
+        self.lazy_decoding = config.lazy_decoding
+        self.compact_items = config.compact_items
+        self.keep_responses = config.keep_responses
+        self.reassembler = TcpReassembler(
+            timeout=config.reassembly_timeout,
+            max_bytes=config.reassembly_max_bytes,
+        )
         self.stop_event = threading.Event()
         self.responses = []
+        self.response_count = 0
+
+        # replaced rather than modified, so publishing iterates a snapshot without locking
+        self.subscribers = ()
+        self.subscribers_lock = threading.Lock()
+
+        self.parse_pool = None
+        if config.parse_workers > 0:
+            self.parse_pool = ParsePool(
+                self.publish,
+                workers=config.parse_workers,
+                executor=config.parse_executor,
+                queue_size=config.parse_queue_size,
+                lazy=self.lazy_decoding,
+                compact=self.compact_items,
+                keep_payload=not self.compact_items,
+            )
 
     def begin_monitoring(self):
         """
         Begin monitoring network traffic on the specified interface.
         """
-        asyncio.set_event_loop(asyncio.new_event_loop())
-
         logger.info(
-            f"Monitoring network traffic on {self.interface} with BPF filter: {self.bpf_filter}"
+            f"Monitoring network traffic on {self.interface} with BPF filter: {self.bpf_filter} ({self.backend})"
         )
 
-        capture = pyshark.LiveCapture(
-            interface=self.interface,
-            bpf_filter=self.bpf_filter,
-        )
+        capture = create_capture(self.backend, self.interface, self.bpf_filter)
 
-        try:
-            for packet in capture.sniff_continuously():
-                if self.is_stopped():
-                    break
+        for segment in capture.segments(self.is_stopped):
+            self.process_segment(segment)
+
+        logger.info(f"Reassembly statistics: {self.reassembler.stats}")
+
+        if self.parse_pool is not None:
+            self.parse_pool.close()
+            logger.info(f"Parse statistics: {self.parse_pool.stats}")
 
-                self.process_packet(packet)
-        finally:
-            capture.close()
+        self.close_subscribers()
 
     def end_monitoring(self):
         """
@@ -63,102 +90,152 @@ class PacketMonitor:
         logger.info("Stopping packet monitor")
         self.stop_event.set()
 
-    def process_packet(self, packet: Packet):
+    def process_segment(self, segment: TcpSegment):
         """
-        Process a packet captured from the network interface.
+        Process a TCP segment, regardless of the source it was captured from.
         """
-        if packet.ip.dst in MONITORED_IPS:
+        if segment.dst in MONITORED_IPS:
             logger.debug("sent packet to Ironmace")
 
-        if packet.ip.src in MONITORED_IPS:
+        if segment.src in MONITORED_IPS:
             logger.debug("received packet from Ironmace")
-            self.process_response_packet(packet)
+            self.process_response_packet(segment)
 
-    def process_response_packet(self, packet: Packet):
+    def process_response_packet(self, segment: TcpSegment):
         """
-        Process a response packet captured from the network interface.
+        Process a response segment received from the marketplace server.
         """
-        payload = get_payload(packet)
-        if payload is None:
+        payload = segment.payload
+        if not payload:
             return
 
         if payload.hex() == KEEP_ALIVE_RESPONSE:
             logger.debug("keep-alive ping received from ironmace")
             return
 
-        ack = int(packet.tcp.ack)
-        seq = int(packet.tcp.seq)
-        nxt = int(packet.tcp.nxtseq)
-
-        # TODO: is it possible for the first part of a response to come after subsequent parts?
-        # If this is possible, the segments when arrived before the first piece will be lost
-        # causing the payload the be incomplete and breaking parsing logic.
-
-        # responses can come in multiple segments, so we need to keep track of them
-        # multiple segments can be identified by the same ack number
-        if begins_marketplace_response(payload):
-            logger.debug("received start of marketplace response")
-            if ack not in self.ack_map:
-                # the ack map consists of 2 pieces.
-                # segments: the payload
-                # sequence: the next expected sequence number
-                self.ack_map[ack] = {"segments": {}, "sequence": {}}
-
-        # if the ack is in the ack_map, this is a continuation of a previous response
-        if ack in self.ack_map:
-            logger.debug(f"Received segment {seq} for ack {ack}, nxt: {nxt}")
-            self.ack_map[ack]["segments"][seq] = payload
-
-            # set the next expected sequence number for the ack
-            if not ends_marketplace_response(payload):
-                logger.debug(f"Segment {seq} is not complete. NXT: {nxt}")
-                self.ack_map[ack]["sequence"][seq] = nxt
-
-            # check each sequence number for the next expected segment
-            # if that expected segment hasn't yet arrived, wait for it before processing
-            for seq, nxt in self.ack_map[ack]["sequence"].items():
-                if nxt and nxt not in self.ack_map[ack]["segments"]:
-                    logger.debug(f"Waiting for segment {nxt} for ack {ack}")
-                    return None
-
-            # if all segments have arrived, process the response
-            logger.debug(f"Received all segments for ack {ack}")
-
-            reconstructed_payload = self.__reconstruct_payload(ack)
+        # responses can come in multiple segments, the reassembler buffers them until complete
+        reconstructed_payload = self.reassembler.add(segment)
+        if reconstructed_payload is None:
+            return
+
+        if self.parse_pool is not None:
+            self.parse_pool.submit(reconstructed_payload)
+            return
+
+        try:
+            response = MarketplaceResponse(
+                reconstructed_payload,
+                lazy=self.lazy_decoding,
+                compact=self.compact_items,
+                keep_payload=not self.compact_items,
+            )
+        except ValueError as e:
+            logger.error(f"Failed to parse marketplace response: {e}")
+            return
+
+        self.publish(response)
+
+    def subscribe(self, callback, on_close=None):
+        """
+        Call callback with every response parsed from now on, and on_close once monitoring ends.
+
+        Callbacks run on the thread that parsed the response, in the order they subscribed,
+        and receive the response itself rather than a copy. A slow callback delays every
+        consumer after it, so hand long-running work off to another thread.
+        """
+        with self.subscribers_lock:
+            self.subscribers = self.subscribers + ((callback, on_close),)
+
+    def unsubscribe(self, callback):
+        """
+        Stop delivering responses to callback.
+        """
+        with self.subscribers_lock:
+            self.subscribers = tuple(
+                subscriber
+                for subscriber in self.subscribers
+                if subscriber[0] != callback
+            )
+
+    def stream(self):
+        """
+        Create an async iterator over the responses parsed from now on.
+        Must be called from a running event loop.
+        """
+        return ResponseStream(self)
+
+    def publish(self, response: MarketplaceResponse):
+        """
+        Record a parsed response and deliver it to the subscribers.
+        """
+        self.response_count += 1
+        if self.keep_responses:
+            self.responses.append(response)
+
+        logger.info(
+            f"Successfully parsed marketplace response with {len(response.items)} items"
+        )
+
+        for callback, _ in self.subscribers:
             try:
-                response = MarketplaceResponse(reconstructed_payload)
-                self.responses.append(response)
-                logger.info(
-                    f"Successfully parsed marketplace response with {len(response.items)} items"
-                )
-            except ValueError as e:
-                logger.error(f"Failed to parse marketplace response: {e}")
+                callback(response)
+            except Exception:
+                logger.exception(f"Subscriber {callback} failed to handle a response")
 
-    def __reconstruct_payload(self, ack: int) -> bytearray:
+    def close_subscribers(self):
         """
-        Reconstruct the payload from the segments.
+        Tell the subscribers that no more responses will be published.
         """
-        sorted_segments = sorted(self.ack_map[ack]["segments"].items())
-        reconstructed_payload = bytearray()
-        for _, segment in sorted_segments:
-            reconstructed_payload.extend(segment)
+        subscribers, self.subscribers = self.subscribers, ()
+        for _, on_close in subscribers:
+            if on_close is not None:
+                on_close()
 
-        return reconstructed_payload
+    def drain(self):
+        """
+        Wait until every reassembled response has been parsed.
+        """
+        if self.parse_pool is not None:
+            self.parse_pool.join()
 
     def is_stopped(self):
         return self.stop_event.is_set()
 
 
-def get_payload(packet: Packet) -> bytearray | None:
+class ResponseStream:
     """
-    Extract the payload from a packet and replace colons with empty strings to give a hex byte array.
+    An async iterator over the responses published by a packet monitor.
+
+    Responses are handed to the event loop thread-safely as they are published and are
+    queued until the consumer is ready for them. Iteration ends when monitoring stops
+    or the stream is closed.
     """
-    try:
-        b = bytearray()
-        for bc in packet.tcp.payload.split(":"):
-            b.append(
-                int(bc, 16)
-            )  # Convert each hex string to a byte and append to the bytearray
-        return b
-    except AttributeError:
-        return None
+
+    def __init__(self, packet_monitor: PacketMonitor):
+        self.packet_monitor = packet_monitor
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        packet_monitor.subscribe(self.__publish, self.__end)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> MarketplaceResponse:
+        response = await self.queue.get()
+        if response is None:
+            raise StopAsyncIteration
+        return response
+
+    def close(self):
+        """
+        Stop receiving responses and end the iteration.
+        """
+        self.packet_monitor.unsubscribe(self.__publish)
+        self.__end()
+
+    def __publish(self, response: MarketplaceResponse):
+        # called on the parsing thread
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, response)
+
+    def __end(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
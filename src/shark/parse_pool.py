@@ -0,0 +1,156 @@
+import logging
+import queue
+import threading
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from shark.marketplace_response import MarketplaceResponse, searchable
+
+logger = logging.getLogger(__name__)
+
+PARSE_EXECUTORS = ["thread", "process"]
+
+
+@dataclass
+class ParseStats:
+    submitted: int = 0  # Payloads accepted onto the queue
+    dropped: int = 0  # Payloads dropped because the queue was full
+    parsed: int = 0  # Responses parsed and published
+    failed: int = 0  # Payloads that could not be parsed
+    max_queue_depth: int = 0  # The deepest the queue has been
+
+
+def parse_response(payload, lazy: bool, compact: bool, keep_payload: bool):
+    """
+    Parse a reassembled payload. Runs in a pool worker.
+    """
+    return MarketplaceResponse(
+        payload, lazy=lazy, compact=compact, keep_payload=keep_payload
+    )
+
+
+class ParsePool:
+    """
+    Parses reassembled payloads off the capture thread.
+
+    submit() only puts the payload on a bounded queue, so capture never waits on parsing;
+    when the queue is full the payload is dropped and counted. A dispatcher thread hands
+    queued payloads to a thread or process pool and publishes the parsed responses in the
+    order they were submitted, so the pages of a search are delivered in sequence.
+    """
+
+    def __init__(
+        self,
+        publish,
+        workers: int = 2,
+        executor: str = "thread",
+        queue_size: int = 256,
+        lazy: bool = False,
+        compact: bool = False,
+        keep_payload: bool = True,
+    ):
+        if executor == "thread":
+            self.executor = ThreadPoolExecutor(workers, thread_name_prefix="parse")
+        elif executor == "process":
+            self.executor = ProcessPoolExecutor(workers)
+        else:
+            raise ValueError(f"Unknown parse executor: {executor}")
+
+        self.publish = publish  # called with each response, on the dispatcher thread
+        self.workers = workers
+        self.lazy = lazy
+        self.compact = compact
+        self.keep_payload = keep_payload
+        self.stats = ParseStats()
+
+        self.queue = queue.Queue(queue_size)
+        self.in_flight: deque[Future] = deque()
+        self.closed = False
+        self.dispatcher = threading.Thread(
+            target=self.__dispatch, name="parse-dispatcher", daemon=True
+        )
+        self.dispatcher.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        The number of payloads waiting to be handed to a worker.
+        """
+        return self.queue.qsize()
+
+    def submit(self, payload) -> bool:
+        """
+        Queue a payload for parsing without blocking. Returns False if it was dropped.
+        """
+        # a view of the whole reassembly buffer is passed as the buffer itself,
+        # which can be pickled for a process pool without another copy
+        data, _ = searchable(payload)
+
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            self.stats.dropped += 1
+            logger.warning(
+                f"Parse queue is full, dropping marketplace response ({self.stats.dropped} dropped)"
+            )
+            return False
+
+        self.stats.submitted += 1
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.queue.qsize())
+        return True
+
+    def join(self):
+        """
+        Wait until every submitted payload has been parsed and published.
+        """
+        self.queue.join()
+
+    def close(self):
+        """
+        Parse the remaining payloads, then stop the dispatcher and the workers.
+        """
+        self.join()
+        self.closed = True
+        self.dispatcher.join()
+        self.executor.shutdown()
+
+    def __dispatch(self):
+        # keep every worker busy, plus one queued result each while the oldest is still parsing
+        max_in_flight = 2 * self.workers
+
+        while not self.closed:
+            try:
+                payload = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                self.__deliver(block=False)
+                continue
+
+            self.in_flight.append(
+                self.executor.submit(
+                    parse_response, payload, self.lazy, self.compact, self.keep_payload
+                )
+            )
+            self.__deliver(block=len(self.in_flight) >= max_in_flight)
+
+        while self.in_flight:
+            self.__deliver(block=True)
+
+    def __deliver(self, block: bool):
+        # results are published strictly in submission order
+        while self.in_flight and (block or self.in_flight[0].done()):
+            future = self.in_flight.popleft()
+            block = False
+
+            try:
+                response = future.result()
+                self.stats.parsed += 1
+                self.publish(response)
+            except ValueError as e:
+                self.stats.failed += 1
+                logger.error(f"Failed to parse marketplace response: {e}")
+            except Exception:
+                logger.exception("Failed to publish marketplace response")
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from dataclasses import dataclass
+
+from shark.dedup import SeenListings
+from shark.marketplace_response import MarketplaceResponse
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PriceHistoryConfig:
+    bucket_seconds: int = 60  # Bucket width; query windows round out to whole buckets
+    retention_seconds: int = 7 * 24 * 60 * 60  # Buckets older than this are dropped
+    dedup_listings: bool = True  # Count a listing once, however often it's viewed
+    dedup_capacity: int = 500_000  # Listings remembered per generation of the dedup set
+
+
+@dataclass
+class PriceStats:
+    count: int  # Listings in the window
+    min: float  # The lowest unit price
+    p10: float  # The 10th percentile unit price
+    median: float  # The median unit price
+    p90: float  # The 90th percentile unit price
+    max: float  # The highest unit price
+
+
+class _Bucket:
+    """
+    The unit prices listed for one key in one time bucket.
+    Prices are appended as they arrive and sorted the first time the bucket is queried.
+    """
+
+    __slots__ = ("prices", "sorted")
+
+    def __init__(self):
+        self.prices = []
+        self.sorted = None
+
+    def add(self, price: float):
+        self.prices.append(price)
+        self.sorted = None
+
+    def sorted_prices(self) -> np.ndarray:
+        if self.sorted is None:
+            self.sorted = np.sort(np.array(self.prices, dtype=np.float64))
+        return self.sorted
+
+
+class PriceHistory:
+    """
+    Recent unit prices of every (name, rarity), for exact market statistics over a time window.
+
+    Each key keeps its prices in time buckets, so a query only touches the buckets of its
+    window rather than every listing. A bucket's prices are converted to a sorted array once
+    and reused by every later query until the bucket changes; stats over an hour of a busy
+    item take tens of microseconds.
+
+    Prices are per unit, the listed price divided by the stack count, so stacks and single
+    items of the same name can be compared. A listing is recorded when its response is first
+    seen and not again when its page is viewed again, so it counts once in any window. Pass
+    the SeenListings the export dedups with, so both agree on which listings are new.
+    """
+
+    def __init__(
+        self, config: PriceHistoryConfig = None, seen_listings: SeenListings = None
+    ):
+        self.config = config or PriceHistoryConfig()
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.oldest_bucket = None
+        self.seen_listings = seen_listings
+        if self.seen_listings is None and self.config.dedup_listings:
+            self.seen_listings = SeenListings(self.config.dedup_capacity)
+
+    def ingest(self, items, observed_at: float = None):
+        """
+        Record the price of each item, as listed at observed_at (a Unix time, defaults to now).
+        Items aren't deduplicated; ingest_response drops listings that were already seen.
+        """
+        observed_at = time.time() if observed_at is None else observed_at
+        bucket_id = int(observed_at // self.config.bucket_seconds)
+
+        with self.lock:
+            for item in items:
+                if item.price is None or item.name is None:
+                    continue
+
+                key_buckets = self.buckets.get((item.name, item.rarity))
+                if key_buckets is None:
+                    key_buckets = self.buckets[(item.name, item.rarity)] = {}
+
+                bucket = key_buckets.get(bucket_id)
+                if bucket is None:
+                    bucket = key_buckets[bucket_id] = _Bucket()
+                bucket.add(item.price / max(item.stack_count or 1, 1))
+
+            self.__expire(bucket_id)
+
+    def ingest_response(self, response: MarketplaceResponse):
+        """
+        Record the new listings of a parsed response; can be subscribed to a packet monitor.
+        """
+        if self.seen_listings is None:
+            self.ingest(response.items)
+        else:
+            self.ingest(self.seen_listings.new_response_items(response))
+
+    def prices(self, name: str, rarity: str, window_seconds: float, now: float = None):
+        """
+        The sorted unit prices of (name, rarity) listed within window_seconds of now.
+        """
+        now = time.time() if now is None else now
+        last = int(now // self.config.bucket_seconds)
+        first = int((now - window_seconds) // self.config.bucket_seconds)
+
+        with self.lock:
+            key_buckets = self.buckets.get((name, rarity))
+            if not key_buckets:
+                return np.empty(0)
+
+            if last - first + 1 < len(key_buckets):
+                buckets = (key_buckets.get(b) for b in range(first, last + 1))
+            else:
+                buckets = (
+                    bucket
+                    for bucket_id, bucket in key_buckets.items()
+                    if first <= bucket_id <= last
+                )
+            arrays = [
+                bucket.sorted_prices() for bucket in buckets if bucket is not None
+            ]
+
+        if not arrays:
+            return np.empty(0)
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.sort(np.concatenate(arrays))
+
+    def stats(
+        self, name: str, rarity: str, window_seconds: float = 60 * 60, now: float = None
+    ):
+        """
+        Min, max and percentiles of the unit prices of (name, rarity) over a window.
+        Returns None if it wasn't listed in the window.
+        """
+        prices = self.prices(name, rarity, window_seconds, now)
+        if len(prices) == 0:
+            return None
+
+        return PriceStats(
+            count=len(prices),
+            min=float(prices[0]),
+            p10=_percentile(prices, 10),
+            median=_percentile(prices, 50),
+            p90=_percentile(prices, 90),
+            max=float(prices[-1]),
+        )
+
+    def __expire(self, bucket_id: int):
+        oldest = bucket_id - self.config.retention_seconds // self.config.bucket_seconds
+        # buckets only need sweeping once the oldest of them has gone past retention
+        if self.oldest_bucket is not None and self.oldest_bucket >= oldest:
+            return
+
+        for key, key_buckets in list(self.buckets.items()):
+            for expired in [b for b in key_buckets if b < oldest]:
+                del key_buckets[expired]
+            if not key_buckets:
+                del self.buckets[key]
+
+        self.oldest_bucket = min(
+            (b for key_buckets in self.buckets.values() for b in key_buckets),
+            default=None,
+        )
+
+
+def _percentile(prices: np.ndarray, q: float) -> float:
+    # np.percentile's linear interpolation, on prices that are already sorted; numpy's own
+    # takes several times longer than merging and sorting a window
+    position = (len(prices) - 1) * q / 100
+    below = int(position)
+    above = min(below + 1, len(prices) - 1)
+    return float(prices[below] + (prices[above] - prices[below]) * (position - below))
@@ -0,0 +1,263 @@
+import logging
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from shark.marketplace_response import (
+    begins_marketplace_response,
+    ends_marketplace_response,
+    is_complete_response,
+)
+from shark.segment import TcpSegment
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_MASK = 0xFFFFFFFF
+INITIAL_BUFFER_SIZE = 16 * 1024
+MAX_RESPONSE_SIZE = 16 * 1024 * 1024
+
+
+@dataclass
+class ReassemblyStats:
+    completed: int = 0  # Responses reassembled and handed off for parsing
+    incomplete: int = 0  # Responses evicted before all of their segments arrived
+    evicted_timeout: int = 0  # Streams evicted because they went stale
+    evicted_budget: int = 0  # Streams evicted to stay within the byte budget
+    duplicate_segments: int = 0  # Retransmitted segments that were already buffered
+    late_segments: int = 0  # Segments for a response that was already completed
+
+
+class _Stream:
+    """
+    The buffered bytes of a single response, identified by flow and ack number.
+
+    Once the header segment has been seen, every segment is written exactly once into a
+    growing buffer at its offset from the header. The contiguous prefix is tracked so
+    completion is detected without re-sorting or re-copying earlier segments.
+    """
+
+    def __init__(self, now: float):
+        self.start = None  # sequence number of the segment with the response header
+        self.pending = {}  # segments that came before the header, seq -> payload
+        self.pending_size = 0
+        self.buffer = None
+        self.contiguous = 0  # number of bytes received without gaps from the header
+        self.ranges = []  # sorted, disjoint (start, end) offsets received past a gap
+        self.last_seen = now
+
+    @property
+    def size(self) -> int:
+        """
+        The number of bytes held by the stream.
+        """
+        if self.buffer is None:
+            return self.pending_size
+        return len(self.buffer)
+
+    def add(self, seq: int, payload) -> bool:
+        """
+        Store a segment. Returns False if every byte of it was already received.
+        """
+        if self.start is None:
+            existing = self.pending.get(seq)
+            if existing is not None and len(existing) >= len(payload):
+                return False
+
+            self.pending[seq] = payload
+            self.pending_size += len(payload) - (
+                len(existing) if existing is not None else 0
+            )
+            return True
+
+        offset = (seq - self.start) & SEQUENCE_MASK
+        if offset > MAX_RESPONSE_SIZE:
+            # sequence numbers before the header belong to an earlier message
+            return False
+
+        end = offset + len(payload)
+        if end <= self.contiguous or self.__covered(offset, end):
+            return False
+
+        if end > len(self.buffer):
+            self.buffer.extend(bytes(max(end, 2 * len(self.buffer)) - len(self.buffer)))
+
+        self.buffer[offset:end] = payload
+        self.__cover(offset, end)
+        return True
+
+    def begin(self, seq: int):
+        """
+        Anchor the stream at the header segment and write the segments buffered before it.
+        """
+        self.start = seq
+        self.buffer = bytearray(INITIAL_BUFFER_SIZE)
+
+        pending, self.pending, self.pending_size = self.pending, {}, 0
+        for pending_seq, payload in pending.items():
+            self.add(pending_seq, payload)
+
+    def complete(self) -> memoryview | None:
+        """
+        Return a view of the response if every byte up to the footer has arrived.
+        """
+        if self.start is None or self.ranges:
+            return None
+
+        # the footer is at most 8 bytes, so only the tail needs to be checked
+        if not ends_marketplace_response(
+            self.buffer[max(0, self.contiguous - 8) : self.contiguous]
+        ):
+            return None
+
+        # a segment can end in bytes that look like a footer; rather than cut the response
+        # short, the stream stays open and is checked again as more segments arrive
+        if not is_complete_response(self.buffer, self.contiguous):
+            return None
+
+        # truncating a bytearray releases the slack without copying the response
+        del self.buffer[self.contiguous :]
+        return memoryview(self.buffer)
+
+    def __covered(self, start: int, end: int) -> bool:
+        for range_start, range_end in self.ranges:
+            if range_start <= start and end <= range_end:
+                return True
+        return False
+
+    def __cover(self, start: int, end: int):
+        if start <= self.contiguous:
+            self.contiguous = max(self.contiguous, end)
+            if not self.ranges:
+                return
+        else:
+            self.ranges.append((start, end))
+            self.ranges.sort()
+
+        # merge ranges that overlap each other or are now reachable from the contiguous prefix
+        merged = []
+        for range_start, range_end in self.ranges:
+            if range_start <= self.contiguous:
+                self.contiguous = max(self.contiguous, range_end)
+            elif merged and range_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+            else:
+                merged.append((range_start, range_end))
+        self.ranges = merged
+
+
+class TcpReassembler:
+    """
+    Reassembles marketplace responses from TCP segments.
+
+    A response is sent as a run of segments that share a flow and an ack number.
+    Segments may arrive out of order, twice, or after the response was completed;
+    streams that never complete are evicted once they are older than `timeout` seconds
+    or when the buffered bytes exceed `max_bytes`, so memory stays flat over long sessions.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        completed_history: int = 4096,  # how many completed responses to remember
+        clock=time.monotonic,
+    ):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.completed_history = completed_history
+        self.clock = clock
+        self.stats = ReassemblyStats()
+
+        # ordered by last activity so the stalest stream is always first
+        self.streams: OrderedDict[tuple, _Stream] = OrderedDict()
+        self.completed: OrderedDict[tuple, float] = OrderedDict()
+        self.buffered_bytes = 0
+
+    def add(self, segment: TcpSegment) -> memoryview | None:
+        """
+        Add a segment to its stream.
+
+        Returns a view of the reassembled payload when this segment completes a response,
+        otherwise None. Each response is returned exactly once.
+        """
+        now = self.clock()
+        self.__evict_stale(now)
+
+        key = (
+            segment.src,
+            segment.src_port,
+            segment.dst,
+            segment.dst_port,
+            segment.ack,
+        )
+
+        if key in self.completed:
+            logger.debug(f"Ignoring late segment {segment.seq} for ack {segment.ack}")
+            self.stats.late_segments += 1
+            return None
+
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = self.streams[key] = _Stream(now)
+        else:
+            self.streams.move_to_end(key)
+            stream.last_seen = now
+
+        size_before = stream.size
+
+        if not stream.add(segment.seq, segment.payload):
+            self.stats.duplicate_segments += 1
+            return None
+
+        logger.debug(f"Received segment {segment.seq} for ack {segment.ack}")
+
+        if stream.start is None and begins_marketplace_response(segment.payload):
+            logger.debug("received start of marketplace response")
+            stream.begin(segment.seq)
+
+        size = stream.size
+        self.buffered_bytes += size - size_before
+
+        reconstructed_payload = stream.complete()
+        if reconstructed_payload is None:
+            logger.debug(f"Waiting for more segments for ack {segment.ack}")
+            self.__enforce_budget()
+            return None
+
+        logger.debug(f"Received all segments for ack {segment.ack}")
+        del self.streams[key]
+        self.buffered_bytes -= size
+        self.completed[key] = now
+        if len(self.completed) > self.completed_history:
+            self.completed.popitem(last=False)
+
+        self.stats.completed += 1
+        return reconstructed_payload
+
+    def __remove(self, key: tuple) -> _Stream:
+        stream = self.streams.pop(key)
+        self.buffered_bytes -= stream.size
+        return stream
+
+    def __evict(self, key: tuple):
+        stream = self.__remove(key)
+        if stream.start is not None:
+            logger.warning(
+                f"Dropping incomplete marketplace response for ack {key[-1]}"
+            )
+            self.stats.incomplete += 1
+
+    def __evict_stale(self, now: float):
+        while self.streams:
+            key, stream = next(iter(self.streams.items()))
+            if now - stream.last_seen < self.timeout:
+                break
+
+            self.__evict(key)
+            self.stats.evicted_timeout += 1
+
+    def __enforce_budget(self):
+        while self.buffered_bytes > self.max_bytes and self.streams:
+            self.__evict(next(iter(self.streams)))
+            self.stats.evicted_budget += 1
@@ -0,0 +1,140 @@
+import logging
+import struct
+import time
+
+from dataclasses import dataclass
+
+from shark.packet_monitor import PacketMonitor
+from shark.segment import parse_frame
+
+logger = logging.getLogger(__name__)
+
+PCAP_MAGIC_MICROSECONDS = 0xA1B2C3D4
+PCAP_MAGIC_NANOSECONDS = 0xA1B23C4D
+PCAPNG_MAGIC = 0x0A0D0D0A
+
+PCAP_GLOBAL_HEADER_SIZE = 24
+PCAP_RECORD_HEADER_SIZE = 16
+
+
+@dataclass
+class ReplayStats:
+    packets: int  # The number of pcap records read
+    responses: int  # The number of marketplace responses parsed
+    items: int  # The number of items parsed from the responses
+    elapsed: float  # The wall clock time of the replay in seconds
+
+    @property
+    def packets_per_second(self) -> float:
+        return self.packets / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.elapsed if self.elapsed else 0.0
+
+
+def read_pcap(path: str):
+    """
+    Read the records of a pcap file.
+
+    Yields tuples of (link type, timestamp, frame bytes).
+    Records are read straight from the file without tshark, so this runs at disk speed.
+    """
+    with open(path, "rb", buffering=1 << 20) as f:
+        header = f.read(PCAP_GLOBAL_HEADER_SIZE)
+        if len(header) < PCAP_GLOBAL_HEADER_SIZE:
+            raise ValueError(f"{path} is too short to be a pcap file")
+
+        # the magic number tells us the byte order and the timestamp resolution
+        for endian in ("<", ">"):
+            magic = struct.unpack_from(f"{endian}I", header)[0]
+            if magic in (PCAP_MAGIC_MICROSECONDS, PCAP_MAGIC_NANOSECONDS):
+                break
+        else:
+            if magic == PCAPNG_MAGIC:
+                raise ValueError(
+                    f"{path} is a pcapng file; convert it with `editcap -F pcap`"
+                )
+            raise ValueError(f"{path} is not a pcap file")
+
+        ts_divisor = 1e9 if magic == PCAP_MAGIC_NANOSECONDS else 1e6
+        linktype = struct.unpack_from(f"{endian}I", header, 20)[0] & 0x0FFFFFFF
+        record_header = struct.Struct(f"{endian}IIII")
+
+        while True:
+            raw_record_header = f.read(PCAP_RECORD_HEADER_SIZE)
+            if len(raw_record_header) < PCAP_RECORD_HEADER_SIZE:
+                return
+
+            ts_sec, ts_frac, captured_length, _ = record_header.unpack(
+                raw_record_header
+            )
+            frame = f.read(captured_length)
+            if len(frame) < captured_length:
+                logger.warning(f"{path} ends with a truncated record")
+                return
+
+            yield linktype, ts_sec + ts_frac / ts_divisor, frame
+
+
+class CaptureClock:
+    """
+    The time of the latest record replayed, as a clock for the reassembler.
+
+    A replay runs far faster than the capture did, so by the wall clock an abandoned
+    response would never time out; by the capture's own timestamps it does, as it did live.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def advance(self, timestamp: float):
+        # records can be slightly out of order; the clock never goes back
+        if timestamp > self.now:
+            self.now = timestamp
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def replay_pcap(packet_monitor: PacketMonitor, path: str) -> ReplayStats:
+    """
+    Feed a saved capture through the packet monitor as fast as it can be read.
+
+    Responses are counted as they are published, so the monitor doesn't need to keep them.
+    """
+    logger.info(f"Replaying {path}")
+
+    clock = CaptureClock()
+    packet_monitor.reassembler.clock = clock
+
+    items = 0
+
+    def count_items(response):
+        nonlocal items
+        items += len(response.items)
+
+    responses_before = packet_monitor.response_count
+    packets = 0
+    start = time.perf_counter()
+
+    packet_monitor.subscribe(count_items)
+    try:
+        for linktype, timestamp, frame in read_pcap(path):
+            packets += 1
+            clock.advance(timestamp)
+            segment = parse_frame(frame, linktype)
+            if segment is not None:
+                packet_monitor.process_segment(segment)
+
+        packet_monitor.drain()
+    finally:
+        packet_monitor.unsubscribe(count_items)
+    elapsed = time.perf_counter() - start
+
+    return ReplayStats(
+        packets=packets,
+        responses=packet_monitor.response_count - responses_before,
+        items=items,
+        elapsed=elapsed,
+    )
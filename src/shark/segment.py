@@ -0,0 +1,117 @@
+import socket
+import struct
+
+from dataclasses import dataclass
+
+# link-layer header types, see https://www.tcpdump.org/linktypes.html
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+
+IP_PROTOCOL_TCP = 6
+
+
+@dataclass
+class TcpSegment:
+    src: str  # The source IP address
+    dst: str  # The destination IP address
+    src_port: int  # The source TCP port
+    dst_port: int  # The destination TCP port
+    seq: int  # The sequence number of the first payload byte
+    ack: int  # The acknowledgment number
+    payload: bytes | bytearray | memoryview  # The TCP payload
+
+    @property
+    def nxt(self) -> int:
+        """
+        The sequence number expected after this segment.
+        """
+        return self.seq + len(self.payload)
+
+
+def parse_frame(frame, linktype: int = LINKTYPE_ETHERNET) -> TcpSegment | None:
+    """
+    Decode a raw link-layer frame into a TCP segment.
+
+    The payload is returned as a memoryview into the frame, so no bytes are copied.
+    Returns None for anything that isn't a TCP segment over IPv4.
+    """
+    view = memoryview(frame)
+
+    if linktype == LINKTYPE_ETHERNET:
+        if len(view) < 14:
+            return None
+        ethertype = struct.unpack_from("!H", view, 12)[0]
+        offset = 14
+
+        # skip over an 802.1Q vlan tag
+        if ethertype == ETHERTYPE_VLAN and len(view) >= 18:
+            ethertype = struct.unpack_from("!H", view, 16)[0]
+            offset = 18
+
+        if ethertype != ETHERTYPE_IPV4:
+            return None
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if len(view) < 16 or struct.unpack_from("!H", view, 14)[0] != ETHERTYPE_IPV4:
+            return None
+        offset = 16
+    elif linktype == LINKTYPE_NULL:
+        # the 4 byte address family is in host byte order of the capturing machine
+        if len(view) < 4 or 2 not in (
+            struct.unpack_from("<I", view, 0)[0],
+            struct.unpack_from(">I", view, 0)[0],
+        ):
+            return None
+        offset = 4
+    elif linktype == LINKTYPE_RAW:
+        offset = 0
+    else:
+        raise ValueError(f"Unsupported link type: {linktype}")
+
+    return parse_ipv4_packet(view[offset:])
+
+
+def parse_ipv4_packet(view: memoryview) -> TcpSegment | None:
+    """
+    Decode an IPv4 packet into a TCP segment.
+    """
+    if len(view) < 20 or view[0] >> 4 != 4:
+        return None
+
+    ihl = (view[0] & 0x0F) * 4
+    total_length = struct.unpack_from("!H", view, 2)[0]
+    if view[9] != IP_PROTOCOL_TCP:
+        return None
+
+    # fragmented packets are not reassembled, the marketplace server never sends them
+    if struct.unpack_from("!H", view, 6)[0] & 0x3FFF:
+        return None
+
+    # the frame may be padded past the end of the ip packet (ethernet minimum frame size);
+    # a total length of 0 is a segmentation offloaded packet, which runs to the end of the frame
+    if total_length:
+        # a frame cut short by the capture's snap length would corrupt the reassembled stream
+        if len(view) < total_length:
+            return None
+        view = view[:total_length]
+
+    tcp = view[ihl:]
+    if len(tcp) < 20:
+        return None
+
+    src_port, dst_port, seq, ack, data_offset = struct.unpack_from("!HHIIB", tcp, 0)
+    header_length = (data_offset >> 4) * 4
+
+    return TcpSegment(
+        src=socket.inet_ntoa(view[12:16]),
+        dst=socket.inet_ntoa(view[16:20]),
+        src_port=src_port,
+        dst_port=dst_port,
+        seq=seq,
+        ack=ack,
+        payload=tcp[header_length:],
+    )
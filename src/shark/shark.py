@@ -7,6 +7,9 @@ import os
 from datetime import datetime
 
 from dataclasses import dataclass
+from shark.dataset import PARQUET_EXTENSION, write_dataset
+from shark.dedup import SeenListings, decodes
+from shark.exporter import StreamingExporter, StreamingExporterConfig
 from shark.packet_monitor import PacketMonitor, PacketMonitorConfig
 
 logger = logging.getLogger(__name__)
@@ -17,6 +20,15 @@ class SharkConfig:
     interface: str  # The local network interface to listen on
     ips: str  # The IP addresses to listen for packets from
     data_dir: str  # The directory to save data to
+    backend: str = "pyshark"  # The capture backend to read packets with
+    lazy_decoding: bool = False  # Decode item fields on first access
+    parse_workers: int = 0  # Workers parsing off the capture thread, 0 to parse inline
+    parse_executor: str = "thread"  # Run the parse workers as threads or processes
+    stream_export: bool = False  # Append items to NDJSON files as they are parsed
+    export_compression: str = "none"  # Compression of the streaming export files
+    export_format: str = "json"  # Export as json or parquet when monitoring stops
+    dedup_listings: bool = True  # Export each listing once, however often it's seen
+    dedup_capacity: int = 500_000  # Listings remembered per generation of the dedup set
 
 
 class Shark:
@@ -30,9 +42,30 @@ class Shark:
                 bpf_filter=" or ".join(
                     [f"src host {ip} or dst host {ip}" for ip in config.ips]
                 ),
+                backend=self.config.backend,
+                lazy_decoding=self.config.lazy_decoding,
+                parse_workers=self.config.parse_workers,
+                parse_executor=self.config.parse_executor,
+                # streamed responses are already on disk
+                keep_responses=not self.config.stream_export,
             )
         )
 
+        # pages and rescans show the same listings again; only the first sighting is exported
+        self.seen_listings = None
+        if self.config.dedup_listings:
+            self.seen_listings = SeenListings(self.config.dedup_capacity)
+
+        self.exporter = None
+        if self.config.stream_export:
+            self.exporter = StreamingExporter(
+                StreamingExporterConfig(
+                    data_dir=self.config.data_dir,
+                    compression=self.config.export_compression,
+                )
+            )
+            self.packet_monitor.subscribe(self.__stream_export, self.exporter.close)
+
         self.window = pywinauto.Application().connect(path="Dark and Darker")[
             "Dark and Darker"
         ]
@@ -69,21 +102,58 @@ class Shark:
         """
         return self.packet_monitor.is_stopped()
 
+    def new_items(self, response) -> list:
+        """
+        The items of a response that should be exported; listings seen in an earlier response
+        and items that can't be decoded are dropped.
+        """
+        if self.seen_listings is None:
+            return [item for item in response.items if decodes(item)]
+        return self.seen_listings.new_response_items(response)
+
+    def __stream_export(self, response):
+        self.exporter.export_items(self.new_items(response))
+
     def export_data(self):
         """
         Export the collected data to a file.
         """
+        if self.exporter is not None:
+            # everything was exported while monitoring
+            self.exporter.close()
+            self.__log_duplicates()
+            return
+
         if not os.path.exists(self.config.data_dir):
             os.makedirs(self.config.data_dir)
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(self.config.data_dir, f"responses_{timestamp}.json")
+
         items = [
-            item.dict()
+            item
             for response in self.packet_monitor.responses
-            for item in response.items
+            for item in self.new_items(response)
         ]
+        self.__log_duplicates()
+
+        if self.config.export_format == "parquet":
+            write_dataset(
+                items,
+                os.path.join(
+                    self.config.data_dir, f"responses_{timestamp}{PARQUET_EXTENSION}"
+                ),
+            )
+            return
+
+        filename = os.path.join(self.config.data_dir, f"responses_{timestamp}.json")
+        items = [item.dict() for item in items]
         with open(filename, "w") as f:
             json.dump(items, f, indent=4)
 
         logger.info(f"Saved {len(items)} responses to {filename}")
+
+    def __log_duplicates(self):
+        if self.seen_listings is not None and self.seen_listings.duplicates:
+            logger.info(
+                f"Skipped {self.seen_listings.duplicates} listings that had already been seen."
+            )
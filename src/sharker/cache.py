@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sharker.ml import (
+    concat_prepared,
+    is_property_column,
+    property_columns,
+    sparse_properties,
+)
+from shark.dataset import table_properties
+
+logger = logging.getLogger(__name__)
+
+# bump when the prepared columns change so stale entries are rebuilt
+CACHE_VERSION = 3
+MANIFEST_NAME = "manifest.json"
+
+
+class PreparedDataCache:
+    """
+    Caches the prepared data of each raw export in its own Parquet file.
+
+    Entries are keyed by the raw file's path, size and modification time, so only new or
+    changed exports are prepared again. Entries for exports that no longer exist are removed.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self.manifest = self.__load_manifest()
+
+    def load(self, raw_files: list, prepare_files) -> pd.DataFrame:
+        """
+        Return the prepared data of every raw file.
+
+        Files that aren't cached or have changed since they were cached are passed to
+        prepare_files(paths), which yields a (path, prepared data) pair for each of them.
+        """
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        frames = []
+        stale = {}
+        for path in raw_files:
+            stat = os.stat(path)
+            key = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            cache_file = os.path.join(self.directory, self.__cache_name(path))
+
+            if self.manifest.get(path) == key and os.path.exists(cache_file):
+                frames.append(_read_prepared(cache_file))
+            else:
+                stale[path] = key
+
+        for path, frame in prepare_files(list(stale)):
+            _write_prepared(
+                frame, os.path.join(self.directory, self.__cache_name(path))
+            )
+            self.manifest[path] = stale[path]
+            frames.append(frame)
+
+        self.__remove_missing(raw_files)
+        self.__save_manifest()
+
+        logger.info(
+            f"Prepared {len(stale)} new or changed files, {len(raw_files) - len(stale)} loaded from cache."
+        )
+
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame()
+
+        return concat_prepared(frames)
+
+    def __cache_name(self, path: str) -> str:
+        return hashlib.sha1(path.encode("utf-8")).hexdigest() + ".parquet"
+
+    def __remove_missing(self, raw_files: list):
+        for path in set(self.manifest) - set(raw_files):
+            del self.manifest[path]
+            cache_file = os.path.join(self.directory, self.__cache_name(path))
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+
+    def __load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except ValueError:
+            logger.warning(
+                f"Ignoring unreadable prepared data manifest {self.manifest_path}"
+            )
+            return {}
+
+        if manifest.get("version") != CACHE_VERSION:
+            return {}
+
+        return manifest["files"]
+
+    def __save_manifest(self):
+        # written to a temporary file first so an interrupted save never corrupts the cache
+        temporary_path = self.manifest_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump({"version": CACHE_VERSION, "files": self.manifest}, f, indent=4)
+        os.replace(temporary_path, self.manifest_path)
+
+
+def _write_prepared(frame: pd.DataFrame, path: str):
+    # properties are stored as a list of (name, value) pairs per item, as in parquet exports,
+    # so the cache is as sparse as the prepared data
+    rows, names, values = sparse_properties(frame)
+    order = np.argsort(rows, kind="stable")
+    offsets = np.searchsorted(rows[order], np.arange(len(frame) + 1))
+
+    properties = pa.ListArray.from_arrays(
+        pa.array(offsets, pa.int32()),
+        pa.StructArray.from_arrays(
+            [pa.array(names[order], pa.string()), pa.array(values[order])],
+            ["name", "value"],
+        ),
+    )
+
+    base = frame[
+        [column for column in frame.columns if not is_property_column(frame[column])]
+    ]
+    table = pa.Table.from_pandas(base, preserve_index=False)
+    pq.write_table(table.append_column("properties", properties), path)
+
+
+def _read_prepared(path: str) -> pd.DataFrame:
+    table = pq.read_table(path)
+    base = table.drop_columns(["properties"]).to_pandas()
+    properties = property_columns(table.num_rows, *table_properties(table))
+    return pd.concat([base, pd.DataFrame(properties)], axis=1)
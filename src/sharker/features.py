@@ -0,0 +1,173 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_FEATURES = ["name", "rarity"]
+
+
+def _column_entries(column: pd.Series, dtype) -> tuple:
+    """
+    The rows and values of a numeric column, without densifying a sparse one.
+    """
+    if isinstance(column.dtype, pd.SparseDtype):
+        # property columns only store the items that have the property
+        array = column.array
+        rows = array.sp_index.to_int_index().indices
+        return rows, np.nan_to_num(array.sp_values.astype(dtype))
+
+    values = np.nan_to_num(column.to_numpy(dtype=dtype))
+    return np.arange(len(values)), values
+
+
+class SparseFeaturizer(TransformerMixin, BaseEstimator):
+    """
+    Turns a prepared DataFrame into a sparse CSR feature matrix.
+
+    The columns are a one-hot encoding of name and rarity followed by the stack count and
+    one column per property. Only non-zero values are stored, so items with a handful of
+    the hundreds of possible properties cost a handful of entries.
+
+    The vocabularies learned in fit are stored on the featurizer and pickled with the model.
+    Names, rarities and properties that weren't seen in training are ignored.
+    """
+
+    def fit(self, x: pd.DataFrame, y=None):
+        self.names_ = sorted(x["name"].dropna().unique())
+        self.rarities_ = sorted(x["rarity"].dropna().unique())
+        self.numeric_features_ = [
+            column for column in x.columns if column not in CATEGORICAL_FEATURES
+        ]
+        return self
+
+    def transform(self, x: pd.DataFrame) -> sparse.csr_matrix:
+        rows = []
+        columns = []
+        values = []
+        offset = 0
+
+        for feature, categories in (("name", self.names_), ("rarity", self.rarities_)):
+            codes = pd.Categorical(x[feature], categories=categories).codes
+            known = np.flatnonzero(codes >= 0)
+            rows.append(known)
+            columns.append(codes[known].astype(np.int64) + offset)
+            values.append(np.ones(len(known)))
+            offset += len(categories)
+
+        for i, feature in enumerate(self.numeric_features_):
+            if feature not in x.columns:
+                continue
+
+            column_rows, column_values = _column_entries(x[feature], np.float64)
+
+            non_zero = np.flatnonzero(column_values)
+            rows.append(column_rows[non_zero])
+            columns.append(np.full(len(non_zero), offset + i))
+            values.append(column_values[non_zero])
+
+        return sparse.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+            shape=(len(x), self.n_features_out_),
+        )
+
+    @property
+    def n_features_out_(self) -> int:
+        return len(self.names_) + len(self.rarities_) + len(self.numeric_features_)
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        return np.array(
+            [f"name_{name}" for name in self.names_]
+            + [f"rarity_{rarity}" for rarity in self.rarities_]
+            + self.numeric_features_,
+            dtype=object,
+        )
+
+    @property
+    def vocabulary(self) -> dict:
+        """
+        The names, rarities and numeric features the model was trained with.
+        """
+        return {
+            "names": list(self.names_),
+            "rarities": list(self.rarities_),
+            "numeric_features": list(self.numeric_features_),
+        }
+
+
+# histogram gradient boosting bins every feature, categories included, into at most 255 bins
+MAX_CATEGORIES = 255
+
+
+class OrdinalFeaturizer(TransformerMixin, BaseEstimator):
+    """
+    Turns a prepared DataFrame into the dense float32 frame histogram gradient boosting expects.
+
+    Name and rarity become categorical columns that the regressor splits on natively, so
+    there are two columns where one-hot encoding needs one per name. Unseen categories are
+    missing values.
+
+    The regressor can't split on more than MAX_CATEGORIES categories. With more names than
+    that, names are ranked by their mean training price and the rank is a numeric feature
+    instead, so trees can still separate expensive names from cheap ones.
+
+    The regressor only takes dense input, so the frame holds 4 bytes per item for every
+    feature. Only properties that some training item has are kept, and sparse property
+    columns are filled straight from their stored entries; still, a million items with 300
+    properties that occur take over a gigabyte.
+    """
+
+    def fit(self, x: pd.DataFrame, y=None):
+        names = x["name"]
+        self.names_are_categorical_ = names.nunique() <= MAX_CATEGORIES
+        if self.names_are_categorical_:
+            self.names_ = sorted(names.dropna().unique())
+        else:
+            if y is None:
+                raise ValueError(
+                    f"Ranking more than {MAX_CATEGORIES} names needs their prices"
+                )
+            mean_prices = pd.Series(np.asarray(y)).groupby(names.to_numpy()).mean()
+            self.names_ = mean_prices.sort_values().index.tolist()
+
+        self.rarities_ = sorted(x["rarity"].dropna().unique())
+        # every feature is a dense column; one no training item has can't be split on anyway
+        self.numeric_features_ = [
+            column
+            for column in x.columns
+            if column not in CATEGORICAL_FEATURES
+            and _column_entries(x[column], np.float32)[1].any()
+        ]
+        return self
+
+    def transform(self, x: pd.DataFrame) -> pd.DataFrame:
+        # the numeric features are written into one block, which the frame wraps without a copy
+        numeric = np.zeros((len(x), len(self.numeric_features_)), dtype=np.float32)
+        for i, feature in enumerate(self.numeric_features_):
+            if feature in x.columns:
+                rows, values = _column_entries(x[feature], np.float32)
+                numeric[rows, i] = values
+
+        frame = pd.DataFrame(
+            numeric, columns=self.numeric_features_, index=x.index, copy=False
+        )
+
+        names = pd.Categorical(x["name"], categories=self.names_)
+        if self.names_are_categorical_:
+            frame.insert(0, "name", names)
+        else:
+            ranks = names.codes.astype(np.float32)
+            ranks[ranks < 0] = np.nan
+            frame.insert(0, "name", ranks)
+
+        frame.insert(
+            0, "rarity", pd.Categorical(x["rarity"], categories=self.rarities_)
+        )
+        return frame
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        return np.array(["rarity", "name"] + self.numeric_features_, dtype=object)
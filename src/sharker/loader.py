@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from sharker.ml import (
+    FINGERPRINT_COLUMN,
+    concat_prepared,
+    prepare_records,
+    prepare_table,
+)
+from shark.dataset import PARQUET_EXTENSION, TRAINING_COLUMNS, read_dataset
+from shark.dedup import listing_fingerprint, record_fingerprint
+from shark.exporter import NDJSON_EXTENSIONS, is_ndjson_export, read_ndjson_export
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+
+# the columns listing fingerprints are made from, besides those needed for training
+FINGERPRINT_COLUMNS = ["sold_by_tag", "expiry_ts"]
+
+_SEPARATOR = re.compile(r"[\s,]*")
+
+# roughly how many bytes of memory preparing a file takes per byte on disk
+MEMORY_PER_FILE_BYTE = {
+    ".json": 1,
+    NDJSON_EXTENSIONS["none"]: 1,
+    NDJSON_EXTENSIONS["gzip"]: 8,
+    NDJSON_EXTENSIONS["zstd"]: 8,
+    PARQUET_EXTENSION: 8,
+}
+
+
+def iter_json_array(path: str, read_size: int = READ_SIZE):
+    """
+    Yield the elements of a JSON array file one at a time, without reading the whole file.
+    """
+    decoder = json.JSONDecoder()
+
+    with open(path, "r") as f:
+        buffer = f.read(read_size)
+        pos = _SEPARATOR.match(buffer).end()
+        if buffer[pos : pos + 1] != "[":
+            raise ValueError(f"{path} does not contain a JSON array")
+        pos += 1
+
+        while True:
+            # skip the separator before the next element
+            pos = _SEPARATOR.match(buffer, pos).end()
+
+            if buffer[pos : pos + 1] == "]":
+                return
+
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # the element continues past the end of the buffer
+                data = f.read(read_size)
+                if not data:
+                    raise ValueError(f"{path} ends in the middle of the array")
+
+                buffer = buffer[pos:] + data
+                pos = 0
+                continue
+
+            yield element
+
+
+def iter_raw_items(path: str):
+    """
+    Yield the item dicts of a JSON or NDJSON export.
+    """
+    if is_ndjson_export(path):
+        return read_ndjson_export(path)
+    return iter_json_array(path)
+
+
+def prepare_file(path: str, chunk_items: int = 50_000) -> pd.DataFrame:
+    """
+    Load and prepare a single raw data file.
+
+    Items are read and prepared in chunks, so at most chunk_items items are held at once.
+    Each row also gets the fingerprint of its listing, so repeats can be dropped across files.
+    """
+    if path.endswith(PARQUET_EXTENSION):
+        # parquet exports are read straight into columns, only the ones needed for training
+        table = read_dataset(path, columns=TRAINING_COLUMNS + FINGERPRINT_COLUMNS)
+        frame = prepare_table(table)
+        frame[FINGERPRINT_COLUMN] = table_fingerprints(table)
+        return frame
+
+    chunks = []
+    records = []
+    fingerprints = []
+    for record in iter_raw_items(path):
+        records.append(record)
+        fingerprints.append(record_fingerprint(record))
+        if len(records) >= chunk_items:
+            chunks.append(prepare_records(records))
+            records = []
+
+    if records or not chunks:
+        chunks.append(prepare_records(records))
+
+    frame = concat_prepared(chunks)
+
+    frame[FINGERPRINT_COLUMN] = np.array(fingerprints, dtype=np.int64)
+    return frame
+
+
+def table_fingerprints(table) -> np.ndarray:
+    """
+    The listing fingerprint of every row of an item table read with read_dataset.
+    """
+    columns = [
+        table.column(column).to_pylist()
+        for column in [
+            "sold_by_tag",
+            "name",
+            "rarity",
+            "properties",
+            "price",
+            "expiry_ts",
+        ]
+    ]
+    return np.fromiter(
+        (
+            listing_fingerprint(
+                sold_by_tag,
+                name,
+                rarity,
+                {pair["name"]: pair["value"] for pair in properties or ()},
+                price,
+                expiry_ts,
+            )
+            for sold_by_tag, name, rarity, properties, price, expiry_ts in zip(*columns)
+        ),
+        dtype=np.int64,
+        count=table.num_rows,
+    )
+
+
+class RawDataLoader:
+    """
+    Prepares raw data files in parallel.
+
+    Files are spread across a process pool and each is prepared in chunks. New files are
+    only started while the estimated memory of the files in progress stays under
+    memory_limit, so a directory of large exports doesn't exhaust memory.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        memory_limit: int = 2 * 1024 * 1024 * 1024,
+        chunk_items: int = 50_000,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_limit = memory_limit
+        self.chunk_items = chunk_items
+
+    def prepare(self, paths: list):
+        """
+        Prepare each file, yielding (path, prepared data) in the order files finish.
+        """
+        if self.workers <= 1 or len(paths) <= 1:
+            for path in paths:
+                yield path, self.__prepare(path)
+            return
+
+        pending = sorted(paths, key=os.path.getsize, reverse=True)
+        in_flight = {}
+        in_flight_memory = 0
+
+        with ProcessPoolExecutor(min(self.workers, len(paths))) as executor:
+            while pending or in_flight:
+                # the largest files are started first so the pool finishes evenly
+                while pending and len(in_flight) < self.workers:
+                    memory = estimate_memory(pending[0])
+                    if in_flight and in_flight_memory + memory > self.memory_limit:
+                        break
+
+                    path = pending.pop(0)
+                    future = executor.submit(prepare_file, path, self.chunk_items)
+                    in_flight[future] = (path, memory)
+                    in_flight_memory += memory
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, memory = in_flight.pop(future)
+                    in_flight_memory -= memory
+
+                    frame = future.result()
+                    logger.info(f"Loaded {len(frame)} items from {path}.")
+                    yield path, frame
+
+    def __prepare(self, path: str) -> pd.DataFrame:
+        frame = prepare_file(path, self.chunk_items)
+        logger.info(f"Loaded {len(frame)} items from {path}.")
+        return frame
+
+
+def estimate_memory(path: str) -> int:
+    """
+    Estimate the memory needed to prepare a raw data file.
+    """
+    for extension, factor in MEMORY_PER_FILE_BYTE.items():
+        if path.endswith(extension):
+            return os.path.getsize(path) * factor
+    return os.path.getsize(path)
@@ -2,15 +2,24 @@ import joblib
 import logging
 import os
 
+import numpy as np
 import pandas as pd
 
-from sklearn.compose import ColumnTransformer
+from shark.columnar import RARITIES
+from shark.dataset import table_properties
+from sharker.features import OrdinalFeaturizer, SparseFeaturizer
+from scipy import sparse
+from sklearn.ensemble import HistGradientBoostingRegressor
 from sklearn.linear_model import LinearRegression
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder
 
 logger = logging.getLogger(__name__)
 
+MODEL_ENGINES = ["linear", "hist_gradient_boosting"]
+
+# the column prepare_file stores each listing's fingerprint in; it isn't a feature
+FINGERPRINT_COLUMN = "fingerprint"
+
 
 def prepare_data(raw_data):
     data = []
@@ -32,22 +41,210 @@ def prepare_data(raw_data):
     return df
 
 
-def train_model(data, model_dir):
-    x = data.drop(columns=["price"])
-    y = data["price"]
+def prepare_columns(columns):
+    """
+    Build the same DataFrame as prepare_data from decoded ItemColumns, without going through items.
+    """
+    data = {
+        "name": np.array(columns.names, dtype=object)[columns.name_id],
+        "rarity": np.array(RARITIES, dtype=object)[columns.rarity],
+        "count": columns.stack_count,
+        "price": columns.price,
+    }
+    for i, property_name in enumerate(columns.property_names):
+        data[property_name] = columns.properties[:, i]
+
+    return pd.DataFrame(data)
+
+
+def prepare_table(table):
+    """
+    Build the same DataFrame as prepare_data from an item table read with read_dataset,
+    with sparse property columns.
+    """
+    data = {
+        "name": table.column("name").to_numpy(),
+        "rarity": table.column("rarity").to_numpy(),
+        "count": table.column("stack_count").to_numpy(),
+        "price": table.column("price").to_numpy(),
+    }
+
+    data.update(property_columns(table.num_rows, *table_properties(table)))
+
+    return pd.DataFrame(data)
+
+
+def prepare_records(records):
+    """
+    Build the same DataFrame as prepare_data from exported item dicts, without creating items.
+    Property columns are sparse, so each item only stores the properties it has.
+    """
+    records = list(records)
+
+    rows = []
+    names = []
+    values = []
+    for row, record in enumerate(records):
+        properties = record.get("properties")
+        if properties:
+            rows.extend([row] * len(properties))
+            names.extend(properties)
+            values.extend(properties.values())
 
-    # One-hot encode categorical variables
-    categorical_features = ["name", "rarity"]
-    categorical_transformer = OneHotEncoder()
+    data = {
+        "name": [record.get("name") for record in records],
+        "rarity": [record.get("rarity") for record in records],
+        "count": [record.get("stack_count") for record in records],
+        "price": [record.get("price") for record in records],
+    }
+    data.update(property_columns(len(records), rows, names, values))
 
-    preprocessor = ColumnTransformer(
-        transformers=[("cat", categorical_transformer, categorical_features)],
-        remainder="passthrough",
+    df = pd.DataFrame(data)
+
+    # Replace NaNs with zeros
+    df.fillna(0, inplace=True)
+
+    return df
+
+
+def property_columns(num_rows, rows, names, values) -> dict:
+    """
+    Build one sparse column per property name from (row, name, value) triples.
+    Only the properties an item has are stored; the rest of a column is an implicit zero.
+    Columns are ordered by first appearance, as they are in prepare_data.
+    """
+    columns, property_names = pd.factorize(np.asarray(names, dtype=object))
+    properties = sparse.csc_matrix(
+        (np.asarray(values), (np.asarray(rows, dtype=np.int64), columns)),
+        shape=(num_rows, len(property_names)),
     )
 
-    model = Pipeline(
-        steps=[("preprocessor", preprocessor), ("regressor", LinearRegression())]
+    frame = pd.DataFrame.sparse.from_spmatrix(properties, columns=property_names)
+    return {
+        property_name: frame[property_name].array for property_name in property_names
+    }
+
+
+def is_property_column(column) -> bool:
+    return isinstance(column.dtype, pd.SparseDtype)
+
+
+def sparse_properties(data) -> tuple:
+    """
+    The (rows, names, values) triples of the sparse property columns of prepared data.
+    """
+    rows = []
+    names = []
+    values = []
+    for property_name, column in data.items():
+        if not is_property_column(column):
+            continue
+
+        array = column.array
+        indices = array.sp_index.to_int_index().indices
+        rows.append(indices)
+        names.append(np.full(len(indices), property_name, dtype=object))
+        values.append(array.sp_values)
+
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, object), np.empty(0)
+
+    return np.concatenate(rows), np.concatenate(names), np.concatenate(values)
+
+
+def concat_prepared(frames) -> pd.DataFrame:
+    """
+    Concatenate prepared data. Frames have different property columns; an item without
+    a property has a zero, and nothing is stored for it.
+    """
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+
+    rows = []
+    names = []
+    values = []
+    offset = 0
+    for frame in frames:
+        frame_rows, frame_names, frame_values = sparse_properties(frame)
+        rows.append(frame_rows + offset)
+        names.append(frame_names)
+        values.append(frame_values)
+        offset += len(frame)
+
+    base = pd.concat(
+        [
+            frame[
+                [
+                    column
+                    for column in frame.columns
+                    if not is_property_column(frame[column])
+                ]
+            ]
+            for frame in frames
+        ],
+        ignore_index=True,
+    ).fillna(0)
+
+    properties = property_columns(
+        len(base), np.concatenate(rows), np.concatenate(names), np.concatenate(values)
     )
+    return pd.concat([base, pd.DataFrame(properties)], axis=1)
+
+
+def drop_duplicate_listings(data, keep_duplicates: bool = False):
+    """
+    Drop rows of listings that were already seen, by their fingerprint, and the fingerprint column.
+    """
+    if FINGERPRINT_COLUMN not in data.columns:
+        return data
+
+    if not keep_duplicates:
+        duplicates = data[FINGERPRINT_COLUMN].duplicated()
+        if duplicates.any():
+            logger.info(
+                f"Dropped {duplicates.sum()} repeated listings out of {len(data)}."
+            )
+            data = data[~duplicates]
+
+    return data.drop(columns=[FINGERPRINT_COLUMN]).reset_index(drop=True)
+
+
+def build_model(engine: str = "linear") -> Pipeline:
+    """
+    Build an untrained pipeline for one of MODEL_ENGINES.
+    """
+    if engine == "linear":
+        # One-hot encode categorical variables and keep the mostly empty property columns sparse.
+        # The featurizer holds the name, rarity and property vocabularies, so they are saved with the model.
+        preprocessor = SparseFeaturizer()
+        regressor = LinearRegression()
+    elif engine == "hist_gradient_boosting":
+        # Trees capture interactions between properties that a linear model can't. Its input is
+        # dense, 4 bytes per item for every property that occurs, and is binned into a byte per
+        # value; fitting uses every core and stops once the held out error stops improving.
+        preprocessor = OrdinalFeaturizer()
+        regressor = HistGradientBoostingRegressor(
+            max_iter=500,
+            categorical_features="from_dtype",
+            early_stopping=True,
+            validation_fraction=0.1,
+            n_iter_no_change=10,
+            random_state=0,
+        )
+    else:
+        raise ValueError(
+            f"Unknown model engine {engine}, expected one of {MODEL_ENGINES}"
+        )
+
+    return Pipeline(steps=[("preprocessor", preprocessor), ("regressor", regressor)])
+
+
+def train_model(data, model_dir, engine: str = "linear"):
+    x = data.drop(columns=["price"])
+    y = data["price"]
+
+    model = build_model(engine)
 
     model.fit(x, y)
 
@@ -64,13 +261,16 @@ def predict_price(model_dir, model, items):
     # Log the DataFrame to debug
     logging.debug(f"DataFrame for prediction:\n{df}")
 
-    # Load the column names from the training data
-    column_names = joblib.load(os.path.join(model_dir, "column_names.pkl"))
+    if not isinstance(
+        model.named_steps["preprocessor"], (SparseFeaturizer, OrdinalFeaturizer)
+    ):
+        # Load the column names from the training data
+        column_names = joblib.load(os.path.join(model_dir, "column_names.pkl"))
 
-    # Ensure the DataFrame has the same columns as the training data
-    for column in column_names:
-        if column not in df.columns:
-            df[column] = 0
+        # Ensure the DataFrame has the same columns as the training data
+        for column in column_names:
+            if column not in df.columns:
+                df[column] = 0
 
     # Check if the DataFrame is empty
     if df.empty:
@@ -0,0 +1,158 @@
+import joblib
+import logging
+import math
+import os
+import time
+
+import numpy as np
+
+from dataclasses import dataclass
+
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.linear_model import SGDRegressor
+
+from shark.marketplace_response import MarketplaceResponse
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OnlineLearnerConfig:
+    checkpoint_path: str  # The file the model is checkpointed to and resumed from
+    checkpoint_interval: float = 60.0  # Seconds between checkpoints
+    n_features: int = 2**20  # Hashed feature columns; new names never need a refit
+    learning_rate: float = 0.01  # Higher follows drift faster but can diverge
+    alpha: float = 1e-5  # L2 regularization; small so rare items aren't flattened
+    min_items: int = 10_000  # Items learned before it is trusted with predictions
+
+
+class OnlineLearner:
+    """
+    Updates a linear price model with every parsed response instead of refitting on all data.
+
+    Items are hashed into a fixed number of feature columns, so names and properties that
+    appear for the first time need no refit, and the regressor is updated with partial_fit.
+    It learns the log of the price from log-scaled property values: prices span several
+    orders of magnitude and unscaled values let a single expensive item swamp the gradient.
+    The learning rate is constant rather than decaying, so the model keeps following the
+    market however long it has been running.
+
+    The learner is saved to checkpoint_path every checkpoint_interval seconds and when the
+    stream ends, and resumes from the checkpoint when it is created again. It is only warmed
+    up, and used for predictions, once it has learned from min_items items.
+    """
+
+    def __init__(self, config: OnlineLearnerConfig):
+        self.config = config
+        self.hasher = FeatureHasher(n_features=config.n_features, input_type="dict")
+        self.regressor = SGDRegressor(
+            learning_rate="constant",
+            eta0=config.learning_rate,
+            alpha=config.alpha,
+        )
+        self.items_learned = 0
+        self.last_checkpoint = time.monotonic()
+
+        self.__resume()
+
+    def learn(self, items):
+        """
+        Update the model with items whose price is known.
+        """
+        items = [item for item in items if item.price and item.name is not None]
+        if not items:
+            return
+
+        self.regressor.partial_fit(
+            self.__features(items),
+            np.log1p(np.fromiter((item.price for item in items), dtype=np.float64)),
+        )
+        self.items_learned += len(items)
+
+        if time.monotonic() - self.last_checkpoint >= self.config.checkpoint_interval:
+            self.checkpoint()
+
+    def learn_response(self, response: MarketplaceResponse):
+        """
+        Update the model with every item of a parsed response; can be subscribed to a packet monitor.
+        """
+        self.learn(response.items)
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.items_learned > 0
+
+    @property
+    def is_warmed_up(self) -> bool:
+        return self.items_learned >= self.config.min_items
+
+    def predict_items(self, items) -> np.ndarray:
+        """
+        Predict the price of each item.
+        """
+        if not items:
+            return np.empty(0)
+        return np.expm1(self.regressor.predict(self.__features(items)))
+
+    def predict_item(self, item) -> float:
+        """
+        Predict the price of a single item.
+        """
+        return float(self.predict_items([item])[0])
+
+    def checkpoint(self):
+        """
+        Save the learner; it is written to a temporary file first so a crash never leaves a partial checkpoint.
+        """
+        self.last_checkpoint = time.monotonic()
+        if not self.is_fitted:
+            return
+
+        temporary_path = self.config.checkpoint_path + ".tmp"
+        joblib.dump(
+            {
+                "regressor": self.regressor,
+                "n_features": self.config.n_features,
+                "items_learned": self.items_learned,
+            },
+            temporary_path,
+        )
+        os.replace(temporary_path, self.config.checkpoint_path)
+
+        logger.info(
+            f"Checkpointed the online model after {self.items_learned} items to {self.config.checkpoint_path}."
+        )
+
+    def __resume(self):
+        if not os.path.exists(self.config.checkpoint_path):
+            return
+
+        checkpoint = joblib.load(self.config.checkpoint_path)
+        if checkpoint["n_features"] != self.config.n_features:
+            logger.warning(
+                f"Ignoring online model checkpoint {self.config.checkpoint_path} hashed into "
+                f"{checkpoint['n_features']} features instead of {self.config.n_features}."
+            )
+            return
+
+        self.regressor = checkpoint["regressor"]
+        self.items_learned = checkpoint["items_learned"]
+        logger.info(
+            f"Resumed the online model from {self.config.checkpoint_path} after {self.items_learned} items."
+        )
+
+    def __features(self, items):
+        return self.hasher.transform(
+            {
+                f"name={item.name}": 1,
+                f"rarity={item.rarity}": 1,
+                "count": _squash(item.stack_count or 0),
+                **{name: _squash(value) for name, value in item.properties.items()},
+            }
+            for item in items
+        )
+
+
+def _squash(value: float) -> float:
+    # property values reach the hundreds; unscaled they make the SGD updates diverge
+    return math.copysign(math.log1p(abs(value)), value)
@@ -0,0 +1,122 @@
+import logging
+
+import numpy as np
+
+from sharker.features import SparseFeaturizer
+from sharker.ml import prepare_data
+
+logger = logging.getLogger(__name__)
+
+# prepare_data stores the stack count in this column
+COUNT_FEATURE = "count"
+
+
+class CompiledPredictor:
+    """
+    Scores items with the weights of a trained linear model, without sklearn or pandas.
+
+    The pipeline's one-hot and property columns are folded into dicts from name, rarity and
+    property to weight when the predictor is built, so predicting a price is a few lookups
+    and a short dot product over the properties the item actually has.
+    """
+
+    def __init__(
+        self,
+        intercept: float,
+        name_weights: dict,
+        rarity_weights: dict,
+        count_weight: float,
+        property_weights: dict,
+    ):
+        self.intercept = intercept
+        self.name_weights = name_weights
+        self.rarity_weights = rarity_weights
+        self.count_weight = count_weight
+        self.property_weights = property_weights
+
+    @classmethod
+    def from_pipeline(cls, model):
+        """
+        Compile a pipeline trained by train_model.
+
+        Raises ValueError for models that don't use the sparse featurizer and a linear regressor.
+        """
+        featurizer = model.named_steps.get("preprocessor")
+        regressor = model.named_steps.get("regressor")
+        if not isinstance(featurizer, SparseFeaturizer) or not hasattr(
+            regressor, "coef_"
+        ):
+            raise ValueError(
+                "Only linear models trained on the sparse featurizer can be compiled"
+            )
+
+        coefficients = np.ravel(regressor.coef_).astype(float).tolist()
+        intercept = float(np.ravel(regressor.intercept_)[0])
+
+        names = featurizer.names_
+        rarities = featurizer.rarities_
+        name_weights = dict(zip(names, coefficients[: len(names)]))
+        rarity_weights = dict(
+            zip(rarities, coefficients[len(names) : len(names) + len(rarities)])
+        )
+        numeric_weights = dict(
+            zip(
+                featurizer.numeric_features_,
+                coefficients[len(names) + len(rarities) :],
+            )
+        )
+        count_weight = numeric_weights.pop(COUNT_FEATURE, 0.0)
+
+        return cls(
+            intercept, name_weights, rarity_weights, count_weight, numeric_weights
+        )
+
+    def predict_item(self, item) -> float:
+        """
+        Predict the price of a single item.
+        """
+        property_weights = self.property_weights
+        price = (
+            self.intercept
+            + self.name_weights.get(item.name, 0.0)
+            + self.rarity_weights.get(item.rarity, 0.0)
+            + self.count_weight * (item.stack_count or 0)
+        )
+        for property_name, value in item.properties.items():
+            weight = property_weights.get(property_name)
+            if weight is not None:
+                price += weight * value
+        return price
+
+    def predict_items(self, items) -> np.ndarray:
+        """
+        Predict the price of each item.
+
+        A page holds only a handful of items, so the fixed cost of a call matters more than
+        the per-item cost; scoring a page costs a few microseconds per item and nothing more.
+        """
+        predict_item = self.predict_item
+        return np.fromiter(
+            (predict_item(item) for item in items), dtype=np.float64, count=len(items)
+        )
+
+
+class PipelinePredictor:
+    """
+    Predicts with the full pipeline, for models that can't be compiled.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict_item(self, item) -> float:
+        """
+        Predict the price of a single item.
+        """
+        return float(self.predict_items([item])[0])
+
+    def predict_items(self, items) -> np.ndarray:
+        """
+        Predict the price of each item.
+        """
+        return np.asarray(self.model.predict(prepare_data(items)), dtype=np.float64)
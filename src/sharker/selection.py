@@ -0,0 +1,143 @@
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.compose import TransformedTargetRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.model_selection import KFold
+from sklearn.pipeline import Pipeline
+
+from sharker.features import SparseFeaturizer
+from sharker.ml import build_model
+
+logger = logging.getLogger(__name__)
+
+
+def candidate_regressors() -> dict:
+    """
+    The regressors compared by select_model, by name.
+
+    A regressor is fit on the one-hot features of a SparseFeaturizer; a candidate that needs
+    other features is a whole pipeline instead.
+    """
+    return {
+        "linear": LinearRegression(),
+        "ridge": Ridge(alpha=1.0),
+        "ridge_strong": Ridge(alpha=10.0),
+        # prices span orders of magnitude; fitting the log keeps cheap items from being ignored
+        "ridge_log_price": TransformedTargetRegressor(
+            regressor=Ridge(alpha=1.0),
+            func=log_price,
+            inverse_func=np.expm1,
+            check_inverse=False,
+        ),
+        "hist_gradient_boosting": build_model("hist_gradient_boosting"),
+    }
+
+
+def log_price(price):
+    # a price below zero only shows up in bad data; clip it rather than produce NaNs
+    return np.log1p(np.maximum(price, 0))
+
+
+@dataclass
+class CandidateResult:
+    name: str  # The candidate's name in candidate_regressors
+    fit_seconds: float  # Mean time to fit one fold
+    predict_microseconds: float  # Mean time to predict one item
+    mean_absolute_error: float  # Mean absolute error across the held out folds
+    root_mean_squared_error: float  # Root mean squared error across the held out folds
+
+
+def evaluate_fold(regressor, x, y, train, test):
+    """
+    Fit a regressor on one fold and return (fit seconds, predict seconds, absolute errors).
+    """
+    regressor = clone(regressor)
+
+    start = time.perf_counter()
+    regressor.fit(_rows(x, train), y[train])
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = regressor.predict(_rows(x, test))
+    predict_seconds = time.perf_counter() - start
+
+    return fit_seconds, predict_seconds, np.abs(predictions - y[test])
+
+
+def select_model(data, candidates: dict = None, folds: int = 5, workers: int = None):
+    """
+    Compare candidate regressors with k-fold cross-validation and refit the best on all the data.
+
+    The sparse featurizer is fit and applied once, rather than once per candidate and fold; it
+    only learns which names, rarities and properties exist, so it doesn't leak prices between
+    folds. Pipeline candidates are fit whole on each fold, since their featurizer may learn
+    from prices. Every (candidate, fold) pair is fit in parallel across workers processes.
+
+    Returns the winning pipeline and a CandidateResult for each candidate, best first.
+    """
+    candidates = candidates or candidate_regressors()
+
+    features = data.drop(columns=["price"])
+    featurizer = SparseFeaturizer()
+    x = featurizer.fit_transform(features)
+    y = data["price"].to_numpy(dtype=np.float64)
+    inputs = {
+        name: features if isinstance(candidate, Pipeline) else x
+        for name, candidate in candidates.items()
+    }
+
+    splits = list(KFold(n_splits=folds, shuffle=True, random_state=0).split(x))
+    tasks = [(name, train, test) for name in candidates for train, test in splits]
+
+    outcomes = Parallel(n_jobs=workers or -1)(
+        delayed(evaluate_fold)(candidates[name], inputs[name], y, train, test)
+        for name, train, test in tasks
+    )
+
+    folds_by_candidate = {name: [] for name in candidates}
+    for (name, _, _), outcome in zip(tasks, outcomes):
+        folds_by_candidate[name].append(outcome)
+
+    results = []
+    for name, candidate_folds in folds_by_candidate.items():
+        fits, predicts, errors = zip(*candidate_folds)
+        errors = np.concatenate(errors)
+        results.append(
+            CandidateResult(
+                name=name,
+                fit_seconds=float(np.mean(fits)),
+                predict_microseconds=sum(predicts) / len(errors) * 1e6,
+                mean_absolute_error=float(errors.mean()),
+                root_mean_squared_error=float(np.sqrt(np.mean(errors**2))),
+            )
+        )
+
+    results.sort(key=lambda result: result.mean_absolute_error)
+    for result in results:
+        logger.info(
+            f"{result.name}: MAE {result.mean_absolute_error:.1f}, "
+            f"RMSE {result.root_mean_squared_error:.1f}, fit {result.fit_seconds:.2f}s, "
+            f"predict {result.predict_microseconds:.2f}us/item"
+        )
+
+    best = results[0].name
+    winner = clone(candidates[best]).fit(inputs[best], y)
+    logger.info(f"Selected {best} out of {len(results)} candidates.")
+
+    if isinstance(winner, Pipeline):
+        return winner, results
+
+    model = Pipeline(steps=[("preprocessor", featurizer), ("regressor", winner)])
+    return model, results
+
+
+def _rows(x, index):
+    return x.iloc[index] if isinstance(x, pd.DataFrame) else x[index]
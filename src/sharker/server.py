@@ -0,0 +1,193 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+from concurrent.futures import Future
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sharker.sharker import Sharker
+from shark.marketplace_response import Item
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PredictionServerConfig:
+    host: str = "127.0.0.1"  # The address to listen on, local only by default
+    port: int = 8765  # The port to listen on
+    batch_window: float = 0.002  # Seconds to wait for more requests to join a batch
+    max_batch_items: int = 256  # Items scored together at most
+
+
+class MicroBatcher:
+    """
+    Groups concurrent prediction requests into batches.
+
+    The first request of a batch waits up to batch_window seconds for others to arrive,
+    then every item in the batch is scored in one call and each request gets its share.
+    """
+
+    def __init__(self, sharker: Sharker, batch_window: float, max_batch_items: int):
+        self.sharker = sharker
+        self.batch_window = batch_window
+        self.max_batch_items = max_batch_items
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.__run, name="batcher", daemon=True)
+        self.thread.start()
+
+    def predict(self, items: list) -> list:
+        """
+        Predict the price of each item, blocking until its batch has been scored.
+        """
+        future = Future()
+        self.requests.put((items, future))
+        return future.result()
+
+    def __run(self):
+        while True:
+            batch = [self.requests.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.batch_window
+
+            while size < self.max_batch_items:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            self.__score(batch)
+
+    def __score(self, batch: list):
+        items = [item for request_items, _ in batch for item in request_items]
+
+        try:
+            predictions = self.sharker.score(items)
+            if predictions is None:
+                raise ValueError("Model has not been trained yet.")
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+
+            # score the requests one at a time so only the one that fails gets the error
+            for request in batch:
+                self.__score([request])
+            return
+
+        start = 0
+        for request_items, future in batch:
+            end = start + len(request_items)
+            future.set_result(
+                [float(prediction) for prediction in predictions[start:end]]
+            )
+            start = end
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /predict with a JSON item, or a list of them, in the export format.
+    Responds with {"predictions": [...]} in the same order.
+    """
+
+    batcher: MicroBatcher = None
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.__respond(200, {"status": "ok"})
+        else:
+            self.__respond(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self.__respond(404, {"error": "not found"})
+            return
+
+        try:
+            items = parse_items(
+                json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            )
+        except (ValueError, TypeError, AttributeError) as e:
+            self.__respond(400, {"error": f"invalid request: {e}"})
+            return
+
+        try:
+            predictions = self.batcher.predict(items)
+        except Exception as e:
+            logger.error(f"Failed to predict prices: {e}")
+            self.__respond(500, {"error": str(e)})
+            return
+
+        self.__respond(200, {"predictions": predictions})
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def __respond(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def parse_items(body) -> list:
+    """
+    Build items from a request body, rejecting anything that would fail while it is
+    scored and take the rest of its batch down with it.
+    """
+    if isinstance(body, dict):
+        body = [body]
+    if not isinstance(body, list):
+        raise TypeError("expected an item or a list of items")
+
+    items = [Item.from_dict(item) for item in body]
+    for item in items:
+        if not isinstance(item.name, str) or not isinstance(item.properties, dict):
+            raise TypeError("items need a name and a dict of properties")
+        if not all(
+            isinstance(value, (int, float)) for value in item.properties.values()
+        ):
+            raise TypeError("property values must be numbers")
+        if not isinstance(item.stack_count, (int, type(None))):
+            raise TypeError("stack_count must be a number")
+        if not isinstance(item.price, (int, float, type(None))):
+            raise TypeError("price must be a number")
+        if not isinstance(item.rarity, (str, type(None))):
+            raise TypeError("rarity must be a string")
+
+    return items
+
+
+class _PredictionServer(ThreadingHTTPServer):
+    # tools connect in bursts; a short listen backlog resets connections
+    request_queue_size = 128
+
+
+def serve(sharker: Sharker, config: PredictionServerConfig):
+    """
+    Serve predictions over HTTP until interrupted, keeping the model loaded.
+    """
+    handler = type(
+        "Handler",
+        (PredictionRequestHandler,),
+        {"batcher": MicroBatcher(sharker, config.batch_window, config.max_batch_items)},
+    )
+
+    server = _PredictionServer((config.host, config.port), handler)
+    logger.info(f"Serving predictions on http://{config.host}:{config.port}/predict")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,169 @@
+import hashlib
+import joblib
+import json
+import logging
+import os
+
+import numpy as np
+
+from joblib import Parallel, delayed
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+
+from sharker.features import CATEGORICAL_FEATURES, SparseFeaturizer
+from sharker.predictor import CompiledPredictor
+
+logger = logging.getLogger(__name__)
+
+# bump when the bundle layout changes so old bundles aren't misread
+BUNDLE_VERSION = 1
+INDEX_NAME = "index.json"
+FALLBACK_NAME = "fallback.pkl"
+
+
+def shard_key(name: str, rarity: str, by_rarity: bool) -> str:
+    return f"{name}|{rarity}" if by_rarity else name
+
+
+def fit_shard(data, path: str) -> int:
+    """
+    Fit a linear model on the items of one shard and save it, compiled, to path.
+    Returns the number of items it was fit on.
+    """
+    # a shard only has a few of the properties; the rest are all zero and only cost time
+    numeric = data.drop(columns=CATEGORICAL_FEATURES + ["price"])
+    used = [column for column in numeric.columns if (numeric[column] != 0).any()]
+    x = data[CATEGORICAL_FEATURES + used]
+
+    model = Pipeline(
+        steps=[("preprocessor", SparseFeaturizer()), ("regressor", LinearRegression())]
+    )
+    model.fit(x, data["price"])
+
+    joblib.dump(CompiledPredictor.from_pipeline(model), path)
+    return len(data)
+
+
+def train_shards(
+    data,
+    directory: str,
+    fallback,
+    by_rarity: bool = False,
+    min_items: int = 50,
+    workers: int = None,
+):
+    """
+    Train one model per item name, or per name and rarity, and save them as a bundle in directory.
+
+    Shards with fewer than min_items items aren't trained; their items are predicted by the
+    fallback, a compiled global model. Shards are fit in parallel across workers processes.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    # the old index goes before the models it points at, so until the new index is written
+    # the directory reads as no bundle rather than a bundle with missing shards
+    index_path = os.path.join(directory, INDEX_NAME)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+    # models of a previous training run that would otherwise linger in the bundle
+    for filename in os.listdir(directory):
+        if filename.endswith(".pkl"):
+            os.remove(os.path.join(directory, filename))
+
+    if by_rarity:
+        grouped = data.groupby(["name", "rarity"])
+    else:
+        grouped = (((name, None), group) for (name,), group in data.groupby(["name"]))
+
+    groups = [
+        (shard_key(name, rarity, by_rarity), group)
+        for (name, rarity), group in grouped
+        if len(group) >= min_items
+    ]
+
+    filenames = {key: _shard_filename(key) for key, _ in groups}
+    sizes = Parallel(n_jobs=workers or -1)(
+        delayed(fit_shard)(group, os.path.join(directory, filenames[key]))
+        for key, group in groups
+    )
+
+    joblib.dump(fallback, os.path.join(directory, FALLBACK_NAME))
+
+    # the index is written last, and atomically, so it only ever appears complete and
+    # pointing at models that are all on disk
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(
+            {"version": BUNDLE_VERSION, "by_rarity": by_rarity, "shards": filenames},
+            f,
+            indent=4,
+        )
+    os.replace(index_path + ".tmp", index_path)
+
+    logger.info(
+        f"Trained {len(groups)} shards on {sum(sizes)} items, "
+        f"{len(data) - sum(sizes)} items are left to the global model."
+    )
+
+
+def _shard_filename(key: str) -> str:
+    return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pkl"
+
+
+class ShardedModel:
+    """
+    Predicts each item with the model of its shard, or the global model if it has none.
+
+    Only the index is read up front; a shard is loaded the first time one of its items is
+    predicted, so a bundle of thousands of shards costs nothing for names that never show up.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+        with open(os.path.join(directory, INDEX_NAME), "r") as f:
+            index = json.load(f)
+        if index.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported model bundle version in {directory}")
+
+        self.by_rarity = index["by_rarity"]
+        self.filenames = index["shards"]
+        self.shards = {}
+        self.fallback = joblib.load(os.path.join(directory, FALLBACK_NAME))
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, INDEX_NAME))
+
+    def shard(self, item):
+        """
+        The predictor for an item, loading its shard if it hasn't been yet.
+        """
+        key = shard_key(item.name, item.rarity, self.by_rarity)
+
+        shard = self.shards.get(key)
+        if shard is None:
+            filename = self.filenames.get(key)
+            if filename is None:
+                return self.fallback
+
+            shard = joblib.load(os.path.join(self.directory, filename))
+            self.shards[key] = shard
+
+        return shard
+
+    def predict_item(self, item) -> float:
+        """
+        Predict the price of a single item.
+        """
+        return self.shard(item).predict_item(item)
+
+    def predict_items(self, items) -> np.ndarray:
+        """
+        Predict the price of each item.
+        """
+        predict_item = self.predict_item
+        return np.fromiter(
+            (predict_item(item) for item in items), dtype=np.float64, count=len(items)
+        )
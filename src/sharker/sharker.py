@@ -1,12 +1,25 @@
 import logging
 import os
-import json
 import pandas as pd
 
 from dataclasses import dataclass
 
-from sharker.ml import load_model, save_model, prepare_data, train_model, predict_price
-from shark.marketplace_response import Item
+from sharker.ml import (
+    drop_duplicate_listings,
+    load_model,
+    save_model,
+    train_model,
+    predict_price,
+)
+from sharker.cache import PreparedDataCache
+from sharker.loader import RawDataLoader
+from sharker.online import OnlineLearner, OnlineLearnerConfig
+from sharker.predictor import CompiledPredictor, PipelinePredictor
+from sharker.selection import select_model
+from sharker.shards import INDEX_NAME, ShardedModel, train_shards
+from shark.dataset import PARQUET_EXTENSION
+from shark.exporter import is_ndjson_export
+from shark.marketplace_response import MarketplaceResponse
 
 logger = logging.getLogger(__name__)
 
@@ -17,12 +30,25 @@ class SharkerConfig:
     model_name: str  # The model name
     raw_data_path: str  # The location of raw data exports from Shark
     prepared_data_path: str  # The location to save prepared data for training
+    load_workers: int = None  # Processes preparing raw data, defaults to the CPUs
+    load_memory_limit: int = 2 * 1024**3  # Estimated bytes of raw data prepared at once
+    engine: str = "linear"  # The model engine, one of MODEL_ENGINES
+    dedup_listings: bool = True  # Train on a listing once, whatever exports it's in
+    sharded: bool = False  # Also train one model per item name
+    shard_by_rarity: bool = False  # Shard by name and rarity instead of name alone
+    min_shard_items: int = 50  # Names with fewer items are left to the global model
+    shard_workers: int = None  # Processes fitting shards, defaults to the CPUs
+    select_model: bool = False  # Keep the best candidate of any engine
+    cv_folds: int = 5  # Folds used to compare candidates
+    cv_workers: int = None  # Processes evaluating candidates, defaults to the CPUs
 
 
 class Sharker:
     def __init__(self, config: SharkerConfig):
         self.config = config
         self.model = self.import_model()
+        self.predictor = self.compile_model()
+        self.online = None
 
     def import_model(self):
         """
@@ -35,6 +61,45 @@ class Sharker:
 
         return load_model(os.path.join(self.config.model_path, self.config.model_name))
 
+    def compile_model(self):
+        """
+        Compile the model into a resident predictor for fast single item predictions.
+        If a sharded model bundle was trained it is used instead, loading shards as they are needed.
+        Returns None if there is no model or it can't be compiled.
+        """
+        if self.model is None:
+            return None
+
+        if ShardedModel.exists(self.shards_path):
+            return ShardedModel(self.shards_path)
+
+        try:
+            return CompiledPredictor.from_pipeline(self.model)
+        except ValueError as e:
+            logger.info(f"Predicting with the full pipeline: {e}")
+            return None
+
+    def enable_online_learning(self, config: OnlineLearnerConfig) -> OnlineLearner:
+        """
+        Create an online learner, resuming from its checkpoint if there is one.
+
+        Once it has warmed up it is used for predictions instead of the trained model; until
+        then the trained model, if any, keeps predicting. Subscribe its learn_response to a
+        packet monitor to keep it up to date.
+        """
+        self.online = OnlineLearner(config)
+        return self.online
+
+    @property
+    def can_predict(self) -> bool:
+        return self.model is not None or (
+            self.online is not None and self.online.is_warmed_up
+        )
+
+    @property
+    def shards_path(self) -> str:
+        return os.path.join(self.config.model_path, "shards")
+
     def export_model(self):
         """
         Export the model to the specified path.
@@ -47,36 +112,120 @@ class Sharker:
         """
         Train the model using the specified data.
         """
-        raw_data = self.__load_raw_data_files()
-        prepared_data = prepare_data(raw_data)
-        self.model = train_model(prepared_data, self.config.model_path)
+        # only exports that are new or changed since the last training run are prepared
+        cache = PreparedDataCache(self.config.prepared_data_path)
+        loader = RawDataLoader(
+            workers=self.config.load_workers,
+            memory_limit=self.config.load_memory_limit,
+        )
+        prepared_data = cache.load(self.__raw_data_files(), loader.prepare)
+        # the same listing is exported by every page and session that saw it
+        prepared_data = drop_duplicate_listings(
+            prepared_data, keep_duplicates=not self.config.dedup_listings
+        )
+
+        if self.config.select_model:
+            self.model, _ = select_model(
+                prepared_data,
+                folds=self.config.cv_folds,
+                workers=self.config.cv_workers,
+            )
+        else:
+            self.model = train_model(
+                prepared_data, self.config.model_path, engine=self.config.engine
+            )
         self.export_model()
+
+        if self.config.sharded:
+            train_shards(
+                prepared_data,
+                self.shards_path,
+                self.__fallback_predictor(),
+                by_rarity=self.config.shard_by_rarity,
+                min_items=self.config.min_shard_items,
+                workers=self.config.shard_workers,
+            )
+        elif ShardedModel.exists(self.shards_path):
+            # shards of an earlier run would otherwise shadow the model just trained
+            os.remove(os.path.join(self.shards_path, INDEX_NAME))
+
+        self.predictor = self.compile_model()
         logger.info("Model trained and saved.")
 
-    def __load_raw_data_files(self):
+    def __fallback_predictor(self):
+        """
+        The global model as a predictor for the items of names without a shard.
         """
-        Load all raw data files from the specified directory.
+        try:
+            return CompiledPredictor.from_pipeline(self.model)
+        except ValueError:
+            return PipelinePredictor(self.model)
+
+    def __raw_data_files(self):
         """
-        all_items = []
-        for filename in os.listdir(self.config.raw_data_path):
-            if filename.endswith(".json"):
-                filepath = os.path.join(self.config.raw_data_path, filename)
-                with open(filepath, "r") as f:
-                    items = json.load(f)
-                    all_items.extend(Item.from_dict(item) for item in items)
-        logger.info(
-            f"Loaded {len(all_items)} items from {len(os.listdir(self.config.raw_data_path))} files."
+        List the raw data files in the specified directory.
+        """
+        return sorted(
+            os.path.join(self.config.raw_data_path, filename)
+            for filename in os.listdir(self.config.raw_data_path)
+            if filename.endswith((".json", PARQUET_EXTENSION))
+            or is_ndjson_export(filename)
         )
-        return all_items
 
     def predict(self, item):
         """
         Predict the price of the specified data.
         """
-        if self.model is None:
+        if not self.can_predict:
             logger.error("Model has not been trained yet.")
             return None
 
+        predictor = self.__predictor()
+        if predictor is not None:
+            return predictor.predict_item(item)
+
         predictions = predict_price(self.config.model_path, self.model, [item])
 
         return predictions[0]
+
+    def score(self, items):
+        """
+        Predict the price of every item in one call and annotate each item with its
+        predicted_price and discount, the fraction it is listed below the predicted price.
+        """
+        if not self.can_predict:
+            logger.error("Model has not been trained yet.")
+            return None
+
+        if not items:
+            return []
+
+        predictor = self.__predictor()
+        if predictor is not None:
+            predictions = predictor.predict_items(items)
+        else:
+            predictions = predict_price(self.config.model_path, self.model, items)
+
+        for item, predicted_price in zip(items, predictions):
+            predicted_price = float(predicted_price)
+            item.predicted_price = predicted_price
+            item.discount = (
+                1 - item.price / predicted_price
+                if item.price is not None and predicted_price > 0
+                else None
+            )
+
+        return predictions
+
+    def score_response(self, response: MarketplaceResponse):
+        """
+        Score every item of a parsed response; can be subscribed to a packet monitor.
+        Responses are left unscored until there is a model to score them with.
+        """
+        if self.can_predict:
+            self.score(response.items)
+
+    def __predictor(self):
+        if self.online is not None and self.online.is_warmed_up:
+            return self.online
+        return self.predictor
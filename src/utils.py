@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def vlq_decode_little_endian_hex(hex_byte_sequence):
     """
     decode a variable length quantity integer (VLQ) from a hex byte sequence
@@ -45,3 +48,37 @@ def vlq_decode_big_endian(data):
         if (byte & 0x80) == 0:
             break
     return result
+
+
+def vlq_decode_little_endian_array(buffer, starts, ends, max_length: int = 9):
+    """
+    decode many little endian VLQ integers from a byte buffer at once
+
+    buffer[starts[i]:ends[i]] holds the bytes of the i-th integer. Returns an int64 array
+    with -1 where no terminating byte was found, which vlq_decode_little_endian reports as None.
+    At most max_length bytes are read per integer so the result fits in 63 bits.
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+
+    if len(starts) == 0 or len(data) == 0:
+        return np.full(len(starts), -1, dtype=np.int64)
+
+    # one row per integer, one column per byte position
+    offsets = starts[:, None] + np.arange(max_length)
+    in_range = offsets < np.minimum(ends, len(data))[:, None]
+    values = np.where(in_range, data[np.minimum(offsets, len(data) - 1)], 0).astype(
+        np.int64
+    )
+
+    # the integer ends at the first byte without the continuation bit
+    terminators = in_range & (values & 0x80 == 0)
+    terminated = terminators.any(axis=1)
+    length = terminators.argmax(axis=1) + 1
+
+    used = np.arange(max_length) < length[:, None]
+    shifts = 7 * np.arange(max_length, dtype=np.int64)
+    decoded = ((values & 0x7F) << shifts).sum(axis=1, where=used)
+
+    return np.where(terminated, decoded, -1)
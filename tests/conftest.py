@@ -0,0 +1,5 @@
+import os
+import sys
+
+# shark and sharker are namespace packages under src, imported the way main.py does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
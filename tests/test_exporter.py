@@ -0,0 +1,59 @@
+import os
+import time
+
+from shark.exporter import (
+    StreamingExporter,
+    StreamingExporterConfig,
+    read_ndjson_export,
+)
+from shark.marketplace_response import Item
+
+
+def _items(count):
+    return [
+        Item.from_dict(
+            {"name": "Longsword", "price": 100, "expiry_ts": "2024-01-01T12:00:00"}
+        )
+        for _ in range(count)
+    ]
+
+
+def _exported(directory):
+    return sum(
+        len(list(read_ndjson_export(os.path.join(directory, filename))))
+        for filename in os.listdir(directory)
+    )
+
+
+def test_zero_flush_seconds_only_writes_full_batches(tmp_path):
+    exporter = StreamingExporter(
+        StreamingExporterConfig(str(tmp_path), batch_items=10, flush_seconds=0)
+    )
+    assert exporter.flusher is None
+
+    exporter.export_items(_items(4))
+    time.sleep(0.05)
+    exporter.export_items(_items(4))
+    assert exporter.items_written == 0
+
+    exporter.export_items(_items(4))
+    assert exporter.items_written == 12
+
+    exporter.export_items(_items(1))
+    exporter.close()
+    assert _exported(tmp_path) == 13
+
+
+def test_buffered_items_are_flushed_without_new_items(tmp_path):
+    exporter = StreamingExporter(
+        StreamingExporterConfig(str(tmp_path), batch_items=10, flush_seconds=0.1)
+    )
+    exporter.export_items(_items(3))
+
+    deadline = time.monotonic() + 2
+    while exporter.items_written == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert exporter.items_written == 3
+    exporter.close()
+    assert _exported(tmp_path) == 3
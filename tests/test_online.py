@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+
+from shark.marketplace_response import Item
+from sharker.online import OnlineLearnerConfig
+from sharker.sharker import Sharker, SharkerConfig
+
+BATCH_PRICE = 1234.0
+
+
+class _BatchPredictor:
+    def predict_items(self, items):
+        return np.full(len(items), BATCH_PRICE)
+
+
+def _items(count):
+    return [
+        Item.from_dict(
+            {
+                "name": "Longsword",
+                "rarity": "Rare",
+                "stack_count": 1,
+                "properties": {"Strength": i % 5},
+                "price": 100 + i % 5,
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def _sharker(tmp_path, min_items):
+    sharker = Sharker(
+        SharkerConfig(
+            model_path=str(tmp_path),
+            model_name="model.pkl",
+            raw_data_path=os.path.join(tmp_path, "export"),
+            prepared_data_path=os.path.join(tmp_path, "prepared"),
+        )
+    )
+    # stands in for a trained batch model
+    sharker.model = object()
+    sharker.predictor = _BatchPredictor()
+    learner = sharker.enable_online_learning(
+        OnlineLearnerConfig(
+            checkpoint_path=os.path.join(tmp_path, "online.pkl"),
+            min_items=min_items,
+        )
+    )
+    return sharker, learner
+
+
+def test_batch_model_predicts_until_online_model_is_warmed_up(tmp_path):
+    sharker, learner = _sharker(tmp_path, min_items=100)
+
+    learner.learn(_items(99))
+    assert learner.is_fitted and not learner.is_warmed_up
+    assert list(sharker.score(_items(3))) == [BATCH_PRICE] * 3
+
+    learner.learn(_items(1))
+    assert learner.is_warmed_up
+    assert all(price != BATCH_PRICE for price in sharker.score(_items(3)))
+
+
+def test_online_model_alone_predicts_nothing_until_warmed_up(tmp_path):
+    sharker, learner = _sharker(tmp_path, min_items=100)
+    sharker.model = None
+    sharker.predictor = None
+
+    learner.learn(_items(10))
+    assert not sharker.can_predict
+    assert sharker.score(_items(3)) is None